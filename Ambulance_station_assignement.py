@@ -1,5 +1,4 @@
-import networkx as nx
-from create_graph import recreate_graph_from_file
+from facility_index import FacilityIndex
 
 def assign_stations_to_hospitals(graph):
     assignments = {}
@@ -9,46 +8,32 @@ def assign_stations_to_hospitals(graph):
     stations = [node for node in graph.nodes if node.startswith('A')]  # Assuming stations start with 'A'
     hospitals = [node for node in graph.nodes if node.startswith('H')]
 
-    # Compute shortest paths from stations to hospitals
+    # One multi-source Dijkstra from all stations labels every node with its nearest station
+    station_index = FacilityIndex.build(graph, stations)
     for hospital in hospitals:
-        shortest_path_length = float('inf')
-        closest_station = None
-        best_path = None
-        for station in stations:
-            try:
-                # Compute the shortest path length to each station
-                path_length = nx.shortest_path_length(graph, station, hospital, weight='weight')
-                path = nx.shortest_path(graph, hospital, station, weight='weight')
-                if path_length < shortest_path_length:
-                    shortest_path_length = path_length
-                    closest_station = station
-                    best_path=path
-            except nx.NetworkXNoPath:
-                # No path exists between station and hospital, skip
-                continue
-        if closest_station:
-            assignments[hospital] = closest_station
-            travel_times[(closest_station, hospital)] = shortest_path_length  # Store travel time
-            travel_paths[(hospital, closest_station)] = best_path
+        if hospital not in station_index:
+            # No path exists between any station and the hospital, skip
+            continue
+        closest_station, shortest_path_length = station_index.nearest(hospital)
+        assignments[hospital] = closest_station
+        travel_times[(closest_station, hospital)] = shortest_path_length  # Store travel time
+        travel_paths[(hospital, closest_station)] = station_index.path(hospital)
 
     return assignments, travel_times, travel_paths
 
-def save_assignments_to_file(assignments, travel_times, travel_paths, file_path):
-    with open(file_path, 'w') as f:
-        f.write("Assignment of Ambulance Stations to Hospitals:\n")
-        for hospital, station in assignments.items():
-            f.write(f"{hospital} assigned to {station}, Travel Time: {travel_times[(station, hospital)]}, path: {travel_paths[(hospital,station)]}\n")
-
-
-file_path = 'graph_structure.txt'
-
-G = recreate_graph_from_file(file_path)
-
-# Assign stations to hospitals based on shortest distance
-station_assignments, travel_times, travel_paths = assign_stations_to_hospitals(G)
-
-# Save the assignments and travel times to a file
-output_file_path = 'hospital_to_station_mapping.txt'
-save_assignments_to_file(station_assignments, travel_times, travel_paths, output_file_path)
-
-print("Ambulance station assignments with travel times have been saved to", output_file_path)
+def hospital_to_station_mapping(graph):
+    # Station of every hospital as the dispatcher uses it; artifact_store.py keeps it per graph file
+    assignments, travel_times, travel_paths = assign_stations_to_hospitals(graph)
+    return {hospital: {'station': station, 'travel_time': travel_times[(station, hospital)],
+                       'travel_path': travel_paths[(hospital, station)]}
+            for hospital, station in assignments.items()}
+
+if __name__ == "__main__":
+    # python Ambulance_station_assignement.py [graph_file]: the station every hospital returns its
+    # ambulances to, built into the artifact store if it is not there yet
+    import sys
+    from artifact_store import open_store
+    file_path = sys.argv[1] if len(sys.argv) > 1 else 'graph_structure.txt'
+    print("Assignment of Ambulance Stations to Hospitals:")
+    for hospital, station_data in open_store(file_path).station_mapping().items():
+        print(f"{hospital} assigned to {station_data['station']}, Travel Time: {station_data['travel_time']}, path: {station_data['travel_path']}")
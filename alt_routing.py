@@ -0,0 +1,222 @@
+import heapq
+from collections import OrderedDict
+import networkx as nx
+import numpy as np
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+except ImportError:  # scipy is optional, fall back to one heap Dijkstra per landmark
+    csgraph_dijkstra = None
+
+# Point-to-point routing for graphs too large for an all-pairs TravelTimeMatrix: A* with the ALT
+# (A*, landmarks, triangle inequality) lower bound |d(L, t) - d(L, v)| over a few landmarks, and a
+# Euclidean bound when every edge is at least `ratio` times as long as the straight line between
+# its ends. Both bounds are admissible, so the routes are exact.
+
+
+def csr_distances(graph, sources, weights=None):
+    # Travel times from each source to every node, (len(sources), n_nodes); `weights` overrides graph.weights
+    weights = graph.weights if weights is None else weights
+    if csgraph_dijkstra is not None:
+        adjacency = csr_matrix((weights, graph.indices, graph.indptr), shape=(graph.n_nodes, graph.n_nodes))
+        return np.atleast_2d(csgraph_dijkstra(adjacency, directed=True, indices=sources))
+    dist = np.full((len(sources), graph.n_nodes), np.inf)
+    for row, source in enumerate(sources):
+        dist[row, source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[row, node]:
+                continue
+            start, end = graph.indptr[node], graph.indptr[node + 1]
+            for neighbor, w in zip(graph.indices[start:end].tolist(), weights[start:end].tolist()):
+                if d + w < dist[row, neighbor]:
+                    dist[row, neighbor] = d + w
+                    heapq.heappush(heap, (d + w, neighbor))
+    return dist
+
+
+def select_landmarks(graph, n_landmarks=8, seed=0):
+    # Farthest-point selection: each landmark is the node farthest from the ones already chosen,
+    # which puts them on the periphery where the bounds are tightest
+    rng = np.random.default_rng(seed)
+    start = int(rng.integers(graph.n_nodes))
+    nearest = csr_distances(graph, [start])[0]
+    landmarks, rows = [], []
+    for _ in range(min(n_landmarks, graph.n_nodes)):
+        landmark = int(np.argmax(np.where(np.isfinite(nearest), nearest, -1.0)))
+        if landmark in landmarks:
+            break
+        row = csr_distances(graph, [landmark])[0]
+        landmarks.append(landmark)
+        rows.append(row)
+        nearest = np.minimum(nearest, row) if len(landmarks) > 1 else row
+    return np.asarray(landmarks, dtype=np.int32), np.array(rows)
+
+
+def euclidean_ratio(graph):
+    # Largest r with weight >= r * straight-line length on every edge, 0 when coordinates don't bound weights
+    length = np.linalg.norm(graph.coords[graph.edge_u] - graph.coords[graph.edge_v], axis=1)
+    positive = length > 0
+    if not positive.any():
+        return 0.0
+    # Shaved slightly so rounding in the sums never makes the bound overestimate
+    return max(0.0, float((graph.edge_w[positive] / length[positive]).min()) * (1 - 1e-9))
+
+
+class RouterTables:
+    # The parts of an ALTRouter that never change, shared by every router over one graph: node
+    # names, the CSR adjacency and base weights as Python lists for the search loop, and the
+    # landmark table transposed to (n_nodes, L)
+    def __init__(self, graph, landmarks, landmark_dist, ratio=0.0):
+        self.graph = graph
+        self.nodes = [str(name) for name in graph.names]
+        self.landmarks = landmarks
+        self.landmark_dist = np.where(np.isfinite(landmark_dist), landmark_dist, np.nan).T.copy()
+        self.ratio = ratio
+        self.indptr = graph.indptr.tolist()
+        self.indices = graph.indices.tolist()
+        self.weights = graph.weights.tolist()
+
+
+class ALTRouter:
+    # Drop-in for TravelTimeMatrix on large graphs: distance()/path() run an A* query, and dist[i, j]
+    # (also with index arrays) answers from an LRU of recent pairs, so the dispatcher's vectorized
+    # lookups work unchanged. settled counts the nodes the last query took off the heap. A router
+    # built from shared RouterTables only owns its pair cache; its edge weights and landmark rows
+    # are copied on the first update_edge that needs them.
+    def __init__(self, graph, landmarks, landmark_dist, ratio=0.0, cache_size=65536, tables=None):
+        tables = tables if tables is not None else RouterTables(graph, landmarks, landmark_dist, ratio)
+        self.tables = tables
+        self.graph = graph
+        self.nodes = tables.nodes
+        self.index = graph.index
+        self.landmarks = tables.landmarks
+        self.landmark_dist = tables.landmark_dist
+        self.ratio = tables.ratio
+        self.coords = graph.coords
+        self.indptr = tables.indptr
+        self.indices = tables.indices
+        self.weights = tables.weights
+        self.weight_array = None  # private weights as an array, set once a road is re-timed
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = self.misses = 0
+        self.dist = PairDistances(self)
+        self.settled = 0
+
+    @classmethod
+    def from_tables(cls, tables, cache_size=65536):
+        return cls(tables.graph, None, None, cache_size=cache_size, tables=tables)
+
+    def heuristic(self, target):
+        # Lower bound on the travel time from any node to target, evaluated lazily per node
+        to_target = self.landmark_dist[target]
+        target_xy = self.coords[target]
+        landmark_dist, coords, ratio = self.landmark_dist, self.coords, self.ratio
+
+        def bound(node):
+            # Landmarks in another component than node or target give no bound (nan)
+            h = np.nanmax(np.abs(landmark_dist[node] - to_target), initial=0.0)
+            if ratio:
+                dx, dy = coords[node] - target_xy
+                h = max(h, ratio * (dx * dx + dy * dy) ** 0.5)
+            return float(h)
+        return bound
+
+    def search(self, source, target):
+        # (travel time, node index path) from source to target, (inf, None) when unreachable
+        if source == target:
+            self.settled = 0
+            return 0.0, [source]
+        bound = self.heuristic(target)
+        indptr, indices, weights = self.indptr, self.indices, self.weights
+        dist = {source: 0.0}
+        pred = {source: -1}
+        h = {source: bound(source)}
+        done = set()
+        heap = [(h[source], source)]
+        while heap:
+            _, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            done.add(node)
+            if node == target:
+                break
+            d = dist[node]
+            for k in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[k]
+                nd = d + weights[k]
+                if nd < dist.get(neighbor, float('inf')):
+                    dist[neighbor] = nd
+                    pred[neighbor] = node
+                    if neighbor not in h:
+                        h[neighbor] = bound(neighbor)
+                    heapq.heappush(heap, (nd + h[neighbor], neighbor))
+        self.settled = len(done)
+        if target not in done:
+            return float('inf'), None
+        path = [target]
+        while path[-1] != source:
+            path.append(pred[path[-1]])
+        return dist[target], path[::-1]
+
+    def pair_distance(self, i, j):
+        key = (i, j)
+        d = self.cache.get(key)
+        if d is None:
+            self.misses += 1
+            d, _ = self.search(i, j)
+            self.cache[key] = d
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        else:
+            self.hits += 1
+            self.cache.move_to_end(key)
+        return d
+
+    def distance(self, source, target):
+        d = self.pair_distance(self.index[source], self.index[target])
+        if d == np.inf:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return float(d)
+
+    def path(self, source, target):
+        d, path = self.search(self.index[source], self.index[target])
+        if path is None:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return [self.nodes[k] for k in path]
+
+    def update_edge(self, graph, u, v, old_weight, new_weight):
+        # Slower or closed roads keep every lower bound valid, so only cached pairs are dropped; a
+        # faster road can break them, so the landmark rows and the Euclidean ratio are recomputed
+        a, b = self.index[u], self.index[v]
+        if self.weight_array is None:
+            self.weight_array = np.array(self.graph.weights)
+            self.weights = self.weight_array.tolist()
+        indptr, indices = self.indptr, self.indices
+        for x, y in ((a, b), (b, a)):
+            for k in range(indptr[x], indptr[x + 1]):
+                if indices[k] == y:
+                    self.weights[k] = self.weight_array[k] = new_weight
+        self.cache.clear()
+        if new_weight < old_weight:
+            landmark_dist = csr_distances(self.graph, self.landmarks, self.weight_array)
+            self.landmark_dist = np.where(np.isfinite(landmark_dist), landmark_dist, np.nan).T.copy()
+            length = float(np.linalg.norm(self.coords[a] - self.coords[b]))
+            if length > 0:
+                self.ratio = min(self.ratio, new_weight / length * (1 - 1e-9))
+
+
+class PairDistances:
+    # router.dist[rows, cols] with the broadcasting rules of a NumPy array index
+    def __init__(self, router):
+        self.router = router
+
+    def __getitem__(self, key):
+        rows, cols = np.broadcast_arrays(*key)
+        out = np.empty(rows.shape)
+        for position, (i, j) in zip(np.ndindex(rows.shape), zip(rows.ravel().tolist(), cols.ravel().tolist())):
+            out[position] = self.router.pair_distance(i, j)
+        return out if out.ndim else float(out)
@@ -0,0 +1,68 @@
+import hashlib
+import json
+import os
+import struct
+import numpy as np
+
+# Single-file container for named NumPy arrays: magic, header length, JSON header, then each
+# array's raw bytes at a 64-byte aligned offset so it can be memory-mapped without copying.
+MAGIC = b'AMBARR1\n'
+ALIGNMENT = 64
+
+
+def save_arrays(file_path, arrays, meta=None):
+    header = {'meta': meta or {}, 'arrays': {}}
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    # Offsets are relative to the start of the data section, which follows the padded header
+    offset = 0
+    for name, array in arrays.items():
+        header['arrays'][name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 8 + len(header_bytes)) // ALIGNMENT) * ALIGNMENT
+
+    tmp_path = file_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        for name, array in arrays.items():
+            f.seek(data_start + header['arrays'][name]['offset'])
+            f.write(array.tobytes())
+        f.truncate(data_start + offset)
+    # Replace in one step so a reader never sees a half-written file
+    os.replace(tmp_path, file_path)
+
+
+def read_meta(file_path):
+    with open(file_path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{file_path} is not an array file")
+        (header_length,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(header_length))
+    data_start = -(-(len(MAGIC) + 8 + header_length) // ALIGNMENT) * ALIGNMENT
+    return header, data_start
+
+
+def load_arrays(file_path, mmap=True):
+    header, data_start = read_meta(file_path)
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype, shape = np.dtype(spec['dtype']), tuple(spec['shape'])
+        if int(np.prod(shape)) == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode='r', offset=data_start + spec['offset'], shape=shape)
+        else:
+            with open(file_path, 'rb') as f:
+                f.seek(data_start + spec['offset'])
+                arrays[name] = np.fromfile(f, dtype=dtype, count=int(np.prod(shape))).reshape(shape)
+    return header['meta'], arrays
+
+
+def file_hash(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
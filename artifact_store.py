@@ -0,0 +1,168 @@
+import os
+import sys
+import numpy as np
+from array_file import save_arrays, load_arrays, file_hash
+from csr_graph import CSRGraph, parse_graph_file
+from travel_times import TravelTimeMatrix, build_travel_times
+from alt_routing import ALTRouter, RouterTables, select_landmarks, euclidean_ratio
+from hospital_assignments import build_hospital_assignments, NO_HOSPITAL
+from Ambulance_station_assignement import hospital_to_station_mapping
+
+# Everything derived from a graph file (the CSR graph, all-pairs travel times, landmark tables,
+# the nearest hospital of every E node and the station of every hospital) lives in one store. Each
+# artifact is an array file (see array_file.py) in <graph>_artifacts/, with node names stored once
+# in the CSR graph and every other artifact holding integer node ids. File names carry the SHA-256
+# of the graph file, so an edited graph file never meets a stale artifact. Missing artifacts are
+# built on first use; loaded ones are memory-mapped and kept by the store, so every dispatcher after
+# the first in a process costs no file I/O. Bump an entry of ARTIFACT_VERSIONS when the way that
+# artifact is computed changes.
+ARTIFACT_VERSIONS = {'csr': 1, 'travel_times': 1, 'landmarks': 1, 'hospital_assignments': 1, 'station_mapping': 1}
+
+stores = {}  # absolute graph file path -> ArtifactStore
+
+
+def open_store(graph_file_path):
+    # The store of a graph file, shared in the process while the file is unchanged; its size and
+    # modification time are checked on every call, the content hash only when they change
+    key = os.path.abspath(graph_file_path)
+    stat = os.stat(key)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    store = stores.get(key)
+    if store is None or store.signature != signature:
+        store = stores[key] = ArtifactStore(key, signature)
+    return store
+
+
+class ArtifactStore:
+    def __init__(self, graph_file_path, signature=None):
+        self.graph_file_path = graph_file_path
+        self.graph_hash = file_hash(graph_file_path)
+        self.signature = signature
+        self.directory = os.path.splitext(graph_file_path)[0] + '_artifacts'
+        self.loaded = {}  # (name, params) -> (meta, arrays)
+        self.decoded = {}  # (name, params) -> object built from the arrays
+
+    def path(self, name, **params):
+        suffix = ''.join(f"_{key}{value}" for key, value in sorted(params.items()))
+        return os.path.join(self.directory, f"{name}{suffix}-{self.graph_hash[:16]}.bin")
+
+    def artifact(self, name, build, **params):
+        # (meta, arrays) of one artifact: from memory, else memory-mapped from disk, else built and saved
+        key = (name, tuple(sorted(params.items())))
+        if key in self.loaded:
+            return self.loaded[key]
+        file_path = self.path(name, **params)
+        try:
+            meta, arrays = load_arrays(file_path)
+            if meta.get('version') != ARTIFACT_VERSIONS[name] or meta.get('graph_hash') != self.graph_hash:
+                raise ValueError(f"{file_path} is stale")
+        except (OSError, ValueError, KeyError):
+            meta, arrays = build()
+            meta = dict(meta, version=ARTIFACT_VERSIONS[name], graph_hash=self.graph_hash)
+            os.makedirs(self.directory, exist_ok=True)
+            self.prune()
+            save_arrays(file_path, arrays, meta)
+            meta, arrays = load_arrays(file_path)
+        self.loaded[key] = meta, arrays
+        return meta, arrays
+
+    def prune(self):
+        # Artifacts of earlier versions of the graph file; processes still mapping them keep their pages
+        keep = f"-{self.graph_hash[:16]}.bin"
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith('.bin') and not file_name.endswith(keep):
+                os.remove(os.path.join(self.directory, file_name))
+
+    def memo(self, name, decode, **params):
+        key = (name, tuple(sorted(params.items())))
+        if key not in self.decoded:
+            self.decoded[key] = decode()
+        return self.decoded[key]
+
+    def graph(self):
+        # Read-only CSRGraph shared by every caller; to_networkx() gives a graph of one's own
+        def decode():
+            _, arrays = self.artifact('csr', lambda: ({}, parse_graph_file(self.graph_file_path).arrays()))
+            return CSRGraph(**arrays)
+        return self.memo('csr', decode)
+
+    def node_names(self):
+        return self.memo('names', lambda: [str(name) for name in self.graph().names])
+
+    def travel_times(self):
+        # A new TravelTimeMatrix over the shared read-only tables; update_edge copies them on first write
+        def build():
+            travel_times = build_travel_times(self.graph())
+            return {}, {'dist': travel_times.dist, 'pred': travel_times.pred}
+        _, arrays = self.artifact('travel_times', build)
+        return TravelTimeMatrix(self.node_names(), arrays['dist'], arrays['pred'])
+
+    def router(self, n_landmarks=8, cache_size=65536):
+        # A new ALTRouter with a private pair cache over tables shared by every router of the store
+        # (the adjacency lists and the transposed landmark table), so only the first call is not cheap
+        def build():
+            landmarks, landmark_dist = select_landmarks(self.graph(), n_landmarks)
+            return {'ratio': euclidean_ratio(self.graph())}, {'landmarks': landmarks, 'landmark_dist': landmark_dist}
+
+        def decode():
+            meta, arrays = self.artifact('landmarks', build, n=n_landmarks)
+            return RouterTables(self.graph(), arrays['landmarks'], arrays['landmark_dist'], meta['ratio'])
+        return ALTRouter.from_tables(self.memo('router_tables', decode, n=n_landmarks), cache_size)
+
+    def hospital_assignments(self):
+        # {emergency node: nearest hospital}, shared: the dispatcher only reads it
+        def build():
+            index = self.graph().index
+            emergency_nodes, hospitals, hospital, travel_time = build_hospital_assignments(self.graph().to_networkx())
+            # The trailing NO_HOSPITAL is what hospital == NO_HOSPITAL (-1) indexes
+            hospital_ids = np.array([index[name] for name in hospitals] + [NO_HOSPITAL], dtype=np.int32)
+            return {}, {'node': np.array([index[name] for name in emergency_nodes], dtype=np.int32),
+                        'hospital': hospital_ids[hospital], 'travel_time': travel_time}
+
+        def decode():
+            _, arrays = self.artifact('hospital_assignments', build)
+            names = self.node_names()
+            return {names[node]: names[hospital] for node, hospital in zip(arrays['node'].tolist(), arrays['hospital'].tolist())
+                    if hospital != NO_HOSPITAL}
+        return self.memo('hospital_assignments', decode)
+
+    def station_mapping(self):
+        # {hospital: {'station', 'travel_time', 'travel_path'}}. Dispatchers repair their station
+        # paths in place when roads change, so every call returns its own copy.
+        def build():
+            index = self.graph().index
+            mapping = hospital_to_station_mapping(self.graph().to_networkx())
+            paths = [station_data['travel_path'] for station_data in mapping.values()]
+            return {}, {
+                'hospital': np.array([index[hospital] for hospital in mapping], dtype=np.int32),
+                'station': np.array([index[station_data['station']] for station_data in mapping.values()], dtype=np.int32),
+                'travel_time': np.array([station_data['travel_time'] for station_data in mapping.values()], dtype=float),
+                'path_indptr': np.cumsum([0] + [len(path) for path in paths], dtype=np.int64),
+                'path_nodes': np.array([index[node] for path in paths for node in path], dtype=np.int32),
+            }
+
+        def decode():
+            _, arrays = self.artifact('station_mapping', build)
+            names = self.node_names()
+            indptr, path_nodes = arrays['path_indptr'].tolist(), arrays['path_nodes'].tolist()
+            return {names[hospital]: {'station': names[station], 'travel_time': travel_time,
+                                      'travel_path': [names[node] for node in path_nodes[indptr[i]:indptr[i + 1]]]}
+                    for i, (hospital, station, travel_time) in enumerate(zip(arrays['hospital'].tolist(), arrays['station'].tolist(),
+                                                                          arrays['travel_time'].tolist()))}
+        mapping = self.memo('station_mapping', decode)
+        return {hospital: dict(station_data, travel_path=list(station_data['travel_path']))
+                for hospital, station_data in mapping.items()}
+
+
+if __name__ == "__main__":
+    # Precompute stage: python artifact_store.py [graph_file] [--landmarks] builds every missing artifact
+    graph_file_path = next((arg for arg in sys.argv[1:] if not arg.startswith('--')), 'graph_structure.txt')
+    store = open_store(graph_file_path)
+    store.graph()
+    store.hospital_assignments()
+    store.station_mapping()
+    if '--landmarks' in sys.argv:
+        store.router()
+    else:
+        store.travel_times()
+    print(f"Artifacts of {graph_file_path} (sha256 {store.graph_hash[:16]}) are in {store.directory}")
@@ -0,0 +1,73 @@
+import numpy as np
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:  # scipy is optional, fall back to the Hungarian method below
+    linear_sum_assignment = None
+
+
+def hungarian(cost):
+    # Minimum-cost assignment of a rectangular matrix (shortest augmenting paths with potentials,
+    # O(n^2 m)); returns (rows, cols) like scipy's linear_sum_assignment
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)  # match[j] = 1-based row assigned to column j, 0 if free
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        match[0] = i
+        j0 = 0
+        min_v = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = match[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (reduced < min_v[1:])
+            min_v[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free, min_v[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[match[used]] += delta
+            v[used] -= delta
+            min_v[1:][free] -= delta
+            j0 = j1
+            if match[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            match[j0] = match[j1]
+            j0 = j1
+    cols = np.nonzero(match[1:])[0]
+    rows = match[1:][cols] - 1
+    order = np.argsort(rows)
+    rows, cols = rows[order], cols[order]
+    if transposed:
+        rows, cols = cols, rows
+        order = np.argsort(rows)
+        rows, cols = rows[order], cols[order]
+    return rows, cols
+
+
+def solve_assignment(cost):
+    # Optimal pairing of rows (calls) and columns (ambulances); unreachable pairs are np.inf and are
+    # never returned. Returns the (row, col) pairs of the finite assignments.
+    cost = np.asarray(cost, dtype=float)
+    if cost.size == 0:
+        return []
+    finite = np.isfinite(cost)
+    if not finite.any():
+        return []
+    # A penalty larger than any complete finite assignment keeps infeasible pairs out whenever possible
+    penalty = (np.abs(cost[finite]).max() + 1) * (min(cost.shape) + 1)
+    cost = np.where(finite, cost, penalty)
+    solver = linear_sum_assignment if linear_sum_assignment is not None else hungarian
+    rows, cols = solver(cost)
+    return [(int(row), int(col)) for row, col in zip(rows, cols) if finite[row, col]]
+
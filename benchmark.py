@@ -0,0 +1,241 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import numpy as np
+from synthetic_graph import generate_graph, write_graph_file
+from csr_graph import parse_graph_file
+from travel_times import build_travel_times
+from alt_routing import select_landmarks
+from hospital_assignments import build_hospital_assignments
+from Ambulance_station_assignement import hospital_to_station_mapping
+from artifact_store import ArtifactStore, open_store
+from results_writer import MemoryResultsWriter
+from event_log import EventLog
+from call_source import poisson_calls
+from profiler import Profiler
+from dispatch_engine import AmbulanceDispatch, POLICIES, PolicyComparison
+
+# Synthetic-graph benchmarks of graph loading, precomputation and the dispatch loop of every
+# AmbulanceDispatch variant. Results are written as JSON; --compare flags metrics that got worse
+# than a previous run by more than --tolerance. With several variants, a single-pass PolicyComparison
+# of all of them is timed as well, next to the sum of the separate runs it shares setup but no
+# per-call work with.
+
+VARIANTS = POLICIES
+DEFAULT_SIZES = (1000, 10000, 100000)
+MATRIX_LIMIT = 5000        # all-pairs travel time table up to this many nodes, A*/landmarks beyond
+CANDIDATE_LIMIT = 8        # nearest ambulances considered per call when routing with A*
+CALL_INTERVAL = 240.0      # mean time between calls per ambulance, keeps the load comparable across sizes
+MINUTES_PER_HOUR = 60.0
+
+
+def timed(function, *args, repeat=1, **kwargs):
+    # (result, fastest of `repeat` wall-clock times), the minimum is the least noisy estimate
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def prepare_graph(n_nodes, seed, data_dir):
+    # Graphs are generated once per size and seed and reused by later runs
+    work_dir = os.path.join(data_dir, f"n{n_nodes}_seed{seed}")
+    os.makedirs(work_dir, exist_ok=True)
+    graph_file = os.path.join(work_dir, 'graph_structure.txt')
+    if not os.path.exists(graph_file):
+        write_graph_file(graph_file, *generate_graph(n_nodes, seed))
+    return work_dir
+
+
+def bench_dispatch(policy, graph, travel_times, assignments, hospital_to_station, stations, emergency_nodes, n_calls, seed, candidate_limit, repeat=1, profile=False):
+    # Keeps the fastest of `repeat` runs of the same call stream; with profile, one more instrumented
+    # run adds the per-phase report without skewing the timings above
+    runs = [run_dispatch(policy, graph, travel_times, assignments, hospital_to_station, stations, emergency_nodes, n_calls, seed, candidate_limit)
+            for _ in range(repeat)]
+    best = min(runs, key=lambda run: run['simulation_s'])
+    if profile:
+        profiler = Profiler()
+        run_dispatch(policy, graph, travel_times, assignments, hospital_to_station, stations, emergency_nodes, n_calls, seed, candidate_limit, profiler)
+        profiler.detach()  # the routing tables are shared with the next variant's timing runs
+        best['profile'] = profiler.report()
+    return best
+
+
+def run_dispatch(policy, graph, travel_times, assignments, hospital_to_station, stations, emergency_nodes, n_calls, seed, candidate_limit, profiler=None):
+    ambulance_data = {i + 1: (station, None, station, None, None) for i, station in enumerate(stations)}
+    results_writer = MemoryResultsWriter()
+    dispatcher = AmbulanceDispatch(graph, ambulance_data, travel_times, results_writer, EventLog(), policy, assignments,
+                                   hospital_to_station)
+    dispatcher.candidate_limit = candidate_limit
+    if profiler is not None:
+        profiler.attach(dispatcher)
+    # Time every dispatch attempt, including the ones made for queued calls
+    latencies = []
+    dispatch_ambulance = dispatcher.dispatch_ambulance
+
+    def timed_dispatch(*args):
+        start = time.perf_counter()
+        dispatched = dispatch_ambulance(*args)
+        latencies.append(time.perf_counter() - start)
+        return dispatched
+    dispatcher.dispatch_ambulance = timed_dispatch
+
+    patient_calls = poisson_calls(len(stations) / CALL_INTERVAL, emergency_nodes, seed=seed, max_calls=n_calls)
+    _, wall = timed(dispatcher.run_simulation, patient_calls)
+    latencies = np.array(latencies) * 1e6
+    simulated_hours = dispatcher.current_time / MINUTES_PER_HOUR
+    return {
+        'calls': n_calls,
+        'served': len(results_writer.records),
+        'simulation_s': wall,
+        'simulated_hours_per_s': simulated_hours / wall if wall else float('inf'),
+        'dispatch_mean_us': float(latencies.mean()) if len(latencies) else None,
+        'dispatch_p50_us': float(np.percentile(latencies, 50)) if len(latencies) else None,
+        'dispatch_p99_us': float(np.percentile(latencies, 99)) if len(latencies) else None,
+    }
+
+
+def bench_side_by_side(variants, graph, travel_times, assignments, hospital_to_station, stations, emergency_nodes, n_calls, seed, candidate_limit, repeat=1):
+    # Every variant over one shared call stream in a single pass
+    ambulance_data = {i + 1: (station, None, station, None, None) for i, station in enumerate(stations)}
+    best = float('inf')
+    for _ in range(repeat):
+        comparison = PolicyComparison(graph, ambulance_data, {variant: VARIANTS[variant] for variant in variants}, travel_times, assignments,
+                                      hospital_to_station)
+        for dispatcher in comparison.dispatchers.values():
+            dispatcher.candidate_limit = candidate_limit
+        patient_calls = poisson_calls(len(stations) / CALL_INTERVAL, emergency_nodes, seed=seed, max_calls=n_calls)
+        _, wall = timed(comparison.run, patient_calls)
+        best = min(best, wall)
+    return {'policies': len(variants), 'simulation_s': best}
+
+
+def bench_size(n_nodes, variants, n_calls, seed, data_dir, routing=None, repeat=1, profile=False):
+    graph_file = os.path.join(prepare_graph(n_nodes, seed, data_dir), 'graph_structure.txt')
+    metrics = {}
+    # Precomputation is timed on the builders themselves, the runs below use the artifact store
+    csr_graph, metrics['parse_graph_s'] = timed(parse_graph_file, graph_file, repeat=repeat)
+    graph, metrics['to_networkx_s'] = timed(csr_graph.to_networkx, repeat=repeat)
+    _, metrics['station_assignment_s'] = timed(hospital_to_station_mapping, graph, repeat=repeat)
+    _, metrics['hospital_assignment_s'] = timed(build_hospital_assignments, graph, repeat=repeat)
+    routing = routing or ('matrix' if n_nodes <= MATRIX_LIMIT else 'alt')
+    _, metrics['routing_setup_s'] = timed(build_travel_times if routing == 'matrix' else select_landmarks, csr_graph, repeat=repeat)
+
+    def load_artifacts(store):
+        travel_times = store.travel_times() if routing == 'matrix' else store.router()
+        return store.graph(), travel_times, store.hospital_assignments(), store.station_mapping()
+    load_artifacts(open_store(graph_file))  # builds whatever is missing
+    # A fresh store maps every artifact from disk, a process's open store answers from memory
+    _, metrics['load_graph_cached_s'] = timed(lambda: ArtifactStore(graph_file).graph(), repeat=repeat)
+    _, metrics['load_artifacts_cached_s'] = timed(lambda: load_artifacts(ArtifactStore(graph_file)), repeat=repeat)
+    (csr_graph, travel_times, assignments, hospital_to_station), metrics['load_artifacts_open_s'] = timed(
+        load_artifacts, open_store(graph_file), repeat=repeat)
+    candidate_limit = None if routing == 'matrix' else CANDIDATE_LIMIT
+
+    nodes = [str(name) for name in csr_graph.names]
+    stations = [node for node in nodes if node.startswith('A')]
+    emergency_nodes = [node for node in nodes if node.startswith('E')]
+    result = {'nodes': n_nodes, 'edges': len(csr_graph.edge_u), 'ambulances': len(stations), 'routing': routing,
+              'setup': metrics, 'variants': {}}
+    for variant in variants:
+        result['variants'][variant] = bench_dispatch(VARIANTS[variant], graph, travel_times, assignments, hospital_to_station,
+                                                     stations, emergency_nodes, n_calls, seed, candidate_limit, repeat, profile)
+    if len(variants) > 1:
+        result['side_by_side'] = bench_side_by_side(variants, graph, travel_times, assignments, hospital_to_station, stations,
+                                                    emergency_nodes, n_calls, seed, candidate_limit, repeat)
+    return result
+
+
+def run_metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+    }
+
+
+def flatten(report):
+    # {"<nodes>/<group>/<metric>": value} of the timing metrics
+    flat = {}
+    for result in report['results']:
+        groups = {'setup': result['setup'], **result['variants']}
+        if 'side_by_side' in result:
+            groups['side_by_side'] = result['side_by_side']
+        for group, metrics in groups.items():
+            for metric, value in metrics.items():
+                if isinstance(value, float) and (metric.endswith('_s') or metric.endswith('_us') or metric.endswith('_per_s')):
+                    flat[f"{result['nodes']}/{group}/{metric}"] = value
+    return flat
+
+
+def compare(report, baseline, tolerance):
+    # Metrics at least `tolerance` worse than the baseline; throughput (_per_s) is better when higher
+    regressions = []
+    current, previous = flatten(report), flatten(baseline)
+    for key, value in current.items():
+        old = previous.get(key)
+        if not old or value is None:
+            continue
+        change = old / value - 1 if key.endswith('_per_s') else value / old - 1
+        if change > tolerance:
+            regressions.append((key, old, value, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the dispatch simulation on synthetic graphs")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--calls', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help="report the fastest of this many runs")
+    parser.add_argument('--routing', default=None, choices=['matrix', 'alt'],
+                        help=f"default: all-pairs table up to {MATRIX_LIMIT} nodes, A*/landmarks beyond")
+    parser.add_argument('--data-dir', default='benchmark_data')
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', default=None, help="earlier results file to check for regressions")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--profile', action='store_true', help="add a per-phase profile of one extra run per variant")
+    args = parser.parse_args()
+
+    report = {'meta': run_metadata(), 'calls': args.calls, 'seed': args.seed, 'repeat': args.repeat, 'results': []}
+    for n_nodes in args.sizes:
+        result = bench_size(n_nodes, args.variants, args.calls, args.seed, os.path.abspath(args.data_dir), args.routing, args.repeat,
+                            args.profile)
+        report['results'].append(result)
+        setup = result['setup']
+        print(f"{n_nodes} nodes ({result['routing']}): parse {setup['parse_graph_s']:.3f}s, cached load {setup['load_graph_cached_s']:.3f}s, "
+              f"all artifacts {setup['load_artifacts_cached_s'] * 1e3:.1f}ms ({setup['load_artifacts_open_s'] * 1e6:.0f}us from an open store), "
+              f"stations {setup['station_assignment_s']:.3f}s, hospitals {setup['hospital_assignment_s']:.3f}s, routing {setup['routing_setup_s']:.3f}s")
+        for variant, stats in result['variants'].items():
+            print(f"  {variant}: {stats['served']}/{stats['calls']} served, {stats['simulated_hours_per_s']:.1f} simulated h/s, "
+                  f"dispatch p50 {stats['dispatch_p50_us']:.0f}us p99 {stats['dispatch_p99_us']:.0f}us")
+            for name, phase in stats.get('profile', {}).get('phases', {}).items():
+                print(f"    {name:<30}{phase['calls']:>10} calls {phase['self_s']:>10.4f}s self {phase['mean_us']:>10.1f}us mean")
+        if 'side_by_side' in result:
+            separate = sum(stats['simulation_s'] for stats in result['variants'].values())
+            print(f"  all {len(result['variants'])} variants in one pass: {result['side_by_side']['simulation_s']:.3f}s "
+                  f"(separate runs {separate:.3f}s)")
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for key, old, new, change in regressions:
+            print(f"REGRESSION {key}: {old:.6g} -> {new:.6g} ({change:+.0%})")
+        if regressions:
+            sys.exit(1)
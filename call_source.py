@@ -0,0 +1,95 @@
+import numpy as np
+
+# Call sources are iterators of (patient_id, (patient_node, patient_type, call_time)) in time order.
+# AmbulanceDispatch.run_simulation pulls one call at a time, so only pending calls are in memory.
+
+
+def calls_from_dict(patient_calls):
+    # The hard-coded {id: (node, type, time)} scenarios, ordered by time (ties keep dict order)
+    return iter(sorted(patient_calls.items(), key=lambda item: item[1][2]))
+
+
+class RateProfile:
+    # Piecewise-constant rate repeating every `period`, e.g. 24 hourly call rates over a day. A class
+    # rather than a closure so that call sources, rate included, can be pickled into snapshots.
+    def __init__(self, rates, period=1440.0):
+        self.rates = np.asarray(rates, dtype=float)
+        self.period = period
+        self.bucket = period / len(self.rates)
+
+    def __call__(self, t):
+        return self.rates[(np.asarray(t) % self.period // self.bucket).astype(int)]
+
+
+def constant_rate(rate):
+    return RateProfile([rate])
+
+
+def rate_profile(rates, period=1440.0):
+    return RateProfile(rates, period)
+
+
+class PoissonCalls:
+    # Non-homogeneous Poisson arrivals by thinning: candidates arrive at max_rate and are kept with
+    # probability rate(t) / max_rate. `rate` is a number or a vectorized function of time,
+    # `weights` the relative call volume of each node. Stops at horizon or after max_calls.
+    # An iterator object instead of a generator so a half-consumed stream, RNG state included,
+    # survives a snapshot (see snapshot.py).
+    def __init__(self, rate, nodes, horizon=None, weights=None, seed=None, max_rate=None, max_calls=None,
+                 patient_types=(1,), type_weights=None, start_time=0.0, first_id=1, batch_size=1024):
+        if not callable(rate):
+            max_rate = rate if max_rate is None else max_rate
+            rate = constant_rate(rate)
+        elif max_rate is None:
+            raise ValueError("max_rate is required for a time-dependent rate")
+        self.rng = np.random.default_rng(seed)
+        self.rate = rate
+        self.max_rate = max_rate
+        self.nodes = nodes
+        self.horizon = horizon
+        self.max_calls = max_calls
+        self.patient_types = patient_types
+        self.node_cdf = np.cumsum(np.ones(len(nodes)) if weights is None else np.asarray(weights, dtype=float))
+        self.node_cdf /= self.node_cdf[-1]
+        self.type_cdf = np.cumsum(np.ones(len(patient_types)) if type_weights is None else np.asarray(type_weights, dtype=float))
+        self.type_cdf /= self.type_cdf[-1]
+        self.batch_size = batch_size
+        self.time = start_time
+        self.first_id = first_id
+        self.patient_id = first_id
+        self.pending = []  # (call time, node, type) drawn but not handed out yet, last one first
+        self.exhausted = False
+
+    def __iter__(self):
+        return self
+
+    def draw_batch(self):
+        # Draw a batch of candidates at once, then hand them out one by one
+        times = self.time + np.cumsum(self.rng.exponential(1.0 / self.max_rate, self.batch_size))
+        keep = self.rng.random(self.batch_size) * self.max_rate < self.rate(times)
+        accepted = times[keep]
+        node_draws = np.searchsorted(self.node_cdf, self.rng.random(len(accepted)), side='right')
+        type_draws = np.searchsorted(self.type_cdf, self.rng.random(len(accepted)), side='right')
+        self.pending = list(zip(accepted.tolist(), node_draws.tolist(), type_draws.tolist()))[::-1]
+        self.time = times[-1]
+
+    def __next__(self):
+        while not self.exhausted and not self.pending:
+            self.draw_batch()
+        if self.exhausted:
+            raise StopIteration
+        call_time, node, patient_type = self.pending.pop()
+        if (self.horizon is not None and call_time > self.horizon) or \
+                (self.max_calls is not None and self.patient_id - self.first_id >= self.max_calls):
+            self.exhausted = True
+            self.pending = []
+            raise StopIteration
+        patient_id = self.patient_id
+        self.patient_id += 1
+        return patient_id, (self.nodes[node], self.patient_types[patient_type], call_time)
+
+
+def poisson_calls(rate, nodes, horizon=None, weights=None, seed=None, max_rate=None, max_calls=None,
+                  patient_types=(1,), type_weights=None, start_time=0.0, first_id=1, batch_size=1024):
+    return PoissonCalls(rate, nodes, horizon, weights, seed, max_rate, max_calls, patient_types, type_weights,
+                        start_time, first_id, batch_size)
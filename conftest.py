@@ -0,0 +1,27 @@
+import os
+import pytest
+from artifact_store import open_store
+from dispatch_engine import AmbulanceDispatch, POLICIES
+from event_log import EventLog, OFF
+
+# Puts the repository root on sys.path so the tests import the modules as the scripts do, and holds
+# the fixtures every test module shares
+GRAPH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'graph_structure.txt')
+
+
+@pytest.fixture(scope='session')
+def store():
+    return open_store(GRAPH_FILE)
+
+
+@pytest.fixture
+def make_dispatcher(store):
+    # make_dispatcher(policy, stations, log): one ambulance per listed station (default: every A node)
+    # on a fresh copy of the graph, with the store's routing tables and a silent log
+    def make(policy='returning', stations=None, log=None):
+        graph = store.graph().to_networkx()
+        stations = stations or [node for node in graph.nodes if node.startswith('A')]
+        return AmbulanceDispatch(graph, {i + 1: (station, None, station, None, None) for i, station in enumerate(stations)},
+                                 store.travel_times(), log=log if log is not None else EventLog(level=OFF), policy=POLICIES[policy],
+                                 assignments=store.hospital_assignments(), hospital_to_station=store.station_mapping())
+    return make
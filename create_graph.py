@@ -1,6 +1,4 @@
 import networkx as nx
-import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
 
 def recreate_graph_from_file(file_path):
     with open(file_path, 'r') as f:
@@ -28,33 +26,18 @@ def recreate_graph_from_file(file_path):
     return G
 
 
-def visualize_graph(G):
-    
-    colors = {'E': 'blue', 'H': 'green', 'A': 'red'}
-    sizes = {'E': 100, 'H': 200, 'A': 300}
-    print(G.nodes(data=True))
-    node_colors = [colors[data['node_type']] for _, data in G.nodes(data=True)]
-    node_sizes = [sizes[data['node_type']] for _, data in G.nodes(data=True)]
-
-   
-    pos = nx.get_node_attributes(G, 'pos')
-
-    
-    plt.figure(figsize=(12, 12))
-    nx.draw(G, pos, with_labels=True, node_color=node_colors, node_size=node_sizes, edge_color='gray', font_size=8)
-
-  
-    legend_handles = [mpatches.Patch(color=color, label=label) for label, color in colors.items()]
-    plt.legend(handles=legend_handles, loc='best')
+def visualize_graph(G, file_path='graph.png'):
+    # Written to an image file (png, svg, ... by extension) on a headless canvas; matplotlib is only
+    # imported when a plot is requested, so loading a graph stays headless
+    from graph_render import render_graph
+    return render_graph(G, file_path)
 
-    plt.title('Visualized Graph from Text File')
-    plt.axis('equal')  
-    plt.show()
+if __name__ == "__main__":
+    # File path to the 'graph_structure.txt' file
+    file_path = 'graph_structure.txt'
 
-# File path to the 'graph_structure.txt' file
-file_path = 'graph_structure.txt'
 
+    G_recreated = recreate_graph_from_file(file_path)
 
-G_recreated = recreate_graph_from_file(file_path)
+    print("Graph written to", visualize_graph(G_recreated))
 
-visualize_graph(G_recreated)
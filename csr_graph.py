@@ -0,0 +1,90 @@
+import numpy as np
+
+# Headless graph loading: no networkx or matplotlib import is needed to read graph_structure.txt.
+
+
+class CSRGraph:
+    # Nodes are integer ids in file order. Neighbours of node i are indices[indptr[i]:indptr[i+1]]
+    # with travel times weights[indptr[i]:indptr[i+1]]; every undirected edge is stored both ways.
+    # edge_u/edge_v/edge_w keep the edges in file order for the networkx adapter.
+    def __init__(self, names, types, coords, indptr, indices, weights, edge_u, edge_v, edge_w):
+        self.names = names
+        self.types = types
+        self.coords = coords
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.edge_u = edge_u
+        self.edge_v = edge_v
+        self.edge_w = edge_w
+        self.index = {str(name): i for i, name in enumerate(names)}
+
+    @property
+    def n_nodes(self):
+        return len(self.names)
+
+    def is_directed(self):
+        # Every edge is stored both ways, as for the networkx graph it stands in for
+        return False
+
+    def neighbors(self, node_id):
+        start, end = self.indptr[node_id], self.indptr[node_id + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def nodes_of_type(self, node_type):
+        return np.flatnonzero(self.types == node_type)
+
+    def arrays(self):
+        return {
+            'names': self.names, 'types': self.types, 'coords': self.coords,
+            'indptr': self.indptr, 'indices': self.indices, 'weights': self.weights,
+            'edge_u': self.edge_u, 'edge_v': self.edge_v, 'edge_w': self.edge_w,
+        }
+
+    def to_networkx(self):
+        # Same node/edge insertion order and attributes as create_graph.recreate_graph_from_file
+        import networkx as nx
+        G = nx.Graph()
+        names = [str(name) for name in self.names]
+        for name, node_type, (x, y) in zip(names, self.types, self.coords.tolist()):
+            G.add_node(name, pos=(x, y), node_type=str(node_type))
+        for u, v, w in zip(self.edge_u.tolist(), self.edge_v.tolist(), self.edge_w.tolist()):
+            G.add_edge(names[u], names[v], weight=w)
+        return G
+
+
+def parse_graph_file(file_path):
+    with open(file_path, 'r') as f:
+        n_nodes = int(next(f))
+        names, types = [], []
+        coords = np.empty((n_nodes, 2))
+        for i in range(n_nodes):
+            node_type, node_number, x, y = next(f).split()
+            names.append(f"{node_type}{node_number}")
+            types.append(node_type)
+            coords[i] = float(x), float(y)
+        index = {name: i for i, name in enumerate(names)}
+        edge_u, edge_v, edge_w = [], [], []
+        for line in f:
+            if not line.strip():
+                continue
+            node1, node2, weight = line.split()
+            edge_u.append(index[node1])
+            edge_v.append(index[node2])
+            edge_w.append(float(weight))
+
+    edge_u = np.asarray(edge_u, dtype=np.int32)
+    edge_v = np.asarray(edge_v, dtype=np.int32)
+    edge_w = np.asarray(edge_w, dtype=np.float64)
+    indptr, indices, weights = build_csr(n_nodes, edge_u, edge_v, edge_w)
+    return CSRGraph(np.asarray(names), np.asarray(types), coords, indptr, indices, weights, edge_u, edge_v, edge_w)
+
+
+def build_csr(n_nodes, edge_u, edge_v, edge_w):
+    src = np.concatenate([edge_u, edge_v])
+    dst = np.concatenate([edge_v, edge_u])
+    w = np.concatenate([edge_w, edge_w])
+    order = np.argsort(src, kind='stable')
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+    return indptr, dst[order].astype(np.int32), w[order]
@@ -0,0 +1,650 @@
+import copy
+import itertools
+import networkx as nx
+import numpy as np
+from routing import k_nearest_ambulances
+from travel_times import TravelTimeMatrix, build_travel_times, path_uses_edge
+from results_writer import MemoryResultsWriter, TripRecord
+from event_log import EventLog, DEBUG, INFO, WARNING, DISPATCH, MOVEMENT, QUEUE
+from fleet_state import FleetState, BUSY, NO_NODE
+from call_source import calls_from_dict
+from triage_queue import TriageQueue
+from batch_assignment import solve_assignment
+from event_queue import EventQueue, CALL, HOSPITAL, BATCH, ROAD, AMBULANCE_EVENTS
+from Ambulance_station_assignement import hospital_to_station_mapping
+from hospital_assignments import hospital_assignment_mapping
+from spatial_index import GraphGeometry
+
+# The dispatch simulation behind simulation_rp.py, sim_wrp.py and update_avlbl.py. What an ambulance
+# does after a delivery is a policy object, and PolicyComparison runs several policies side by side
+# over one call stream, sharing the graph, the routing tables and the call generation.
+
+
+class ReturnToStation:
+    # After delivering, the ambulance drives back to the hospital's nearest station along the
+    # precomputed path. With track_routes, the candidate search hands back its paths to the patient
+    # so the chosen ambulance's route is not looked up again.
+    def __init__(self, track_routes=False):
+        self.track_routes = track_routes
+
+    def after_delivery(self, dispatcher, ambulance_id, hospital, arrival_time):
+        fleet = dispatcher.fleet
+        station_data = dispatcher.hospital_to_station[hospital]
+        path = station_data['travel_path']
+        fleet.release(ambulance_id, fleet.node_index[hospital], fleet.node_index[station_data['station']], dispatcher.current_time)
+        # Head back to the station along the precomputed path, leaving the hospital when it got there;
+        # its position is only looked up (by bisection) when a dispatch needs it
+        fleet.set_route(ambulance_id, [fleet.node_index[node] for node in path], dispatcher.edge_times(path), arrival_time)
+
+
+class StayAtHospital:
+    # Without the returning protocol the ambulance waits at the hospital for its next call
+    def __init__(self, track_routes=False):
+        self.track_routes = track_routes
+
+    def after_delivery(self, dispatcher, ambulance_id, hospital, arrival_time):
+        fleet = dispatcher.fleet
+        fleet.release(ambulance_id, fleet.node_index[hospital], fleet.node_index[hospital], dispatcher.current_time)
+
+
+# Ambulances nearest the patient in a straight line whose travel times bound the prefilter
+PREFILTER_PROBE = 4
+
+POLICIES = {
+    'returning': ReturnToStation(),
+    'non_returning': StayAtHospital(),
+    'en_route': ReturnToStation(track_routes=True),
+}
+
+
+def retime_road(graph, travel_times, traffic, u, v, weight):
+    # Applies a road change to the graph and the routing data, -> the old weight
+    old_weight = graph[u][v]['weight']
+    graph[u][v]['weight'] = weight
+    if traffic is not None:
+        traffic.update_edge(graph, u, v, old_weight, weight)
+    else:
+        travel_times.update_edge(graph, u, v, old_weight, weight)
+    return old_weight
+
+
+class AmbulanceDispatch:
+    def __init__(self, graph, ambulance_data, travel_times=None, results_writer=None, log=None, policy=None,
+                 assignments=None, hospital_to_station=None):
+        self.graph = graph
+        self.travel_times = travel_times if travel_times is not None else build_travel_times(graph)
+        self.results_writer = results_writer if results_writer is not None else MemoryResultsWriter()
+        self.log = log if log is not None else EventLog()
+        self.policy = policy if policy is not None else POLICIES['returning']
+        if assignments is None:
+            # Nearest hospital of every E node, built from the graph; pass artifact_store's hospital_assignments() to skip the search
+            assignments = hospital_assignment_mapping(graph)
+        self.assignments = assignments
+        self.candidate_limit = None  # Only consider the k nearest available ambulances for large fleets
+        self.batch_window = None  # Hold calls this long and assign them jointly; None dispatches each call on arrival
+        self.batch_due = None
+        self.traffic = None  # TrafficTravelTimes; when set, routing uses the time-of-day table of the current time
+        self.profiler = None  # Set by profiler.Profiler().attach(dispatcher), which times the phases of this instance
+        self.prefilter = None  # Straight-line pruning of candidates before routing queries; None: only for routers without a dense table
+        self.geometry = None  # GraphGeometry, built on first use from the nodes' 'pos'
+        self.fleet = FleetState.from_ambulance_data(ambulance_data, self.travel_times.nodes)
+        self.priority_queue = TriageQueue()  # Waiting calls by patient id, see triage_queue.py for acuity classes and aging
+        self.stranded = set()  # Parked calls already warned about
+        self.parked = {}  # patient_id -> (item, enqueue_time, acuity) of calls no free ambulance can reach, retried on road or fleet changes
+        self.cancelled_calls = set()
+        self.current_time = 0  # Track the current time for dispatches
+        self.was_queue_processed = False  # Track whether the queue was processed
+        self.events = EventQueue()
+        self.event_versions = {}  # Bumped whenever an ambulance starts a new trip, stale events are skipped
+        if hospital_to_station is None:
+            # Built from the graph; pass artifact_store's station_mapping() to skip the search
+            hospital_to_station = hospital_to_station_mapping(graph)
+        self.hospital_to_station = hospital_to_station
+        self.call_source = iter(())
+        self.last_call_time = float('inf')
+        self.road_changes = []  # (u, v, weight) in the order applied, replayed when a snapshot is restored
+
+    def find_nearby_ambulances(self, patient_node, radius=float('inf'), k=None):
+        if k is not None or radius != float('inf'):
+            # Bounded search outward from the patient instead of one lookup per ambulance
+            ambulances_at_node = {}
+            slots = self.fleet.available_slots()
+            self.fleet.sync_positions(slots, self.current_time)
+            for slot in slots:
+                ambulances_at_node.setdefault(self.fleet.nodes[self.fleet.node[slot]], []).append(self.fleet.ids[slot])
+            weight = self.traffic.weight_function(self.current_time) if self.traffic is not None else None
+            if self.profiler is not None:
+                self.profiler.count('nearest_searches')
+            # Policies that track routes keep the search's path to the patient instead of looking it up again
+            return k_nearest_ambulances(self.graph, patient_node, ambulances_at_node, k=k, radius=radius,
+                                        with_paths=self.policy.track_routes, weight=weight)
+
+        nearby_ambulances = {}
+        # One vectorized lookup for every available ambulance
+        slots = self.fleet.available_slots()
+        self.fleet.sync_positions(slots, self.current_time)
+        if self.prefilter or (self.prefilter is None and not isinstance(self.travel_times, TravelTimeMatrix)):
+            slots = self.plausible_slots(slots, patient_node, radius)
+        distances = self.travel_times.dist[self.fleet.node[slots], self.travel_times.index[patient_node]]
+        if self.profiler is not None:
+            self.profiler.count('distance_reads', len(slots))
+        reachable = distances < np.inf
+        for slot, path_length in zip(slots[reachable & (distances <= radius)], distances[reachable & (distances <= radius)]):
+            nearby_ambulances[self.fleet.ids[slot]] = (self.fleet.nodes[self.fleet.node[slot]], float(path_length))
+
+        if not nearby_ambulances and reachable.any():
+            slot = slots[reachable][np.argmin(distances[reachable])]
+            nearby_ambulances[self.fleet.ids[slot]] = (self.fleet.nodes[self.fleet.node[slot]], float(distances[reachable].min()))
+
+        return nearby_ambulances
+
+
+    def plausible_slots(self, slots, patient_node, radius):
+        # Travel time is at least ratio * straight-line distance. The nearest few ambulances by
+        # straight line give an upper bound on the best travel time; an ambulance whose lower bound
+        # is above it (or above the radius) cannot be the one select_best_ambulance picks.
+        if len(slots) <= PREFILTER_PROBE:
+            return slots
+        geometry = self.graph_geometry()
+        lower = geometry.lower_bounds(self.fleet.node[slots], patient_node)
+        if self.traffic is not None:
+            lower *= self.traffic.profile.profiles.min()
+        probe = np.argpartition(lower, PREFILTER_PROBE)[:PREFILTER_PROBE]
+        upper = self.travel_times.dist[self.fleet.node[slots[probe]], self.travel_times.index[patient_node]]
+        if self.profiler is not None:
+            self.profiler.count('distance_reads', len(probe))
+        upper = upper[upper < np.inf]
+        if not len(upper):
+            return slots
+        return slots[lower <= min(upper.min(), radius)]
+
+    def graph_geometry(self):
+        if self.geometry is None:
+            self.geometry = GraphGeometry(self.graph, self.fleet.nodes)
+        return self.geometry
+
+    def locate_call(self, patient_call):
+        # Calls may give an (x, y) position instead of a node; it is snapped to the nearest E node
+        location = patient_call[0]
+        if isinstance(location, str):
+            return patient_call
+        node, _ = self.graph_geometry().calls.snap(*location)
+        self.log.event(DEBUG, DISPATCH, self.current_time, "Call at %s snapped to %s", location, node)
+        return (node,) + tuple(patient_call[1:])
+
+    def dispatch_ambulance(self, patient_call, hospital_node, patient_type, patient_id):
+        self.log.event(DEBUG, DISPATCH, self.current_time, "Patient call %s id %s", patient_call, patient_id)
+        patient_node=patient_call[0]
+        self.update_available_ambulances()
+
+        if not self.fleet.has_available():
+            priority = self.determine_priority(patient_node, self.current_time)
+            self.log.event(INFO, QUEUE, self.current_time, "No ambulances available, enqueued patient at %s with priority %s", patient_node, priority)
+            self.priority_queue.push(patient_id, (patient_call, hospital_node, patient_type), priority, self.determine_acuity(patient_call))
+            return False
+
+
+        nearby_ambulances = self.find_nearby_ambulances(patient_node, k=self.candidate_limit)
+        if not nearby_ambulances:
+            self.log.event(INFO, QUEUE, self.current_time, "No nearby ambulances found; adding to queue")
+            self.priority_queue.push(patient_id, (patient_call, hospital_node, patient_type), self.determine_priority(patient_node, self.current_time), self.determine_acuity(patient_call))
+            return False
+
+        best_ambulance_id, best_cost = self.select_best_ambulance(nearby_ambulances, patient_node, hospital_node)
+        if best_ambulance_id is None:
+            self.log.event(INFO, QUEUE, self.current_time, "Unable to find a suitable ambulance for dispatch; adding to queue")
+            self.priority_queue.push(patient_id, (patient_call, hospital_node, patient_type), self.determine_priority(patient_node, self.current_time), self.determine_acuity(patient_call))
+            return False
+        found = nearby_ambulances[best_ambulance_id]
+        self.mark_ambulance_unavailable(best_ambulance_id, hospital_node, best_cost, patient_call, patient_id,
+                                        found[2] if len(found) > 2 else None)
+        if self.log.enabled(INFO, DISPATCH):
+            # The arrival is only looked up when the event is kept
+            self.log.event(INFO, DISPATCH, self.current_time, "Ambulance %s dispatched to %s for patient %s, will be free at %s", best_ambulance_id, patient_node, patient_id, self.fleet.free_at[self.fleet.slot[best_ambulance_id]])
+        return True
+
+    def update_available_ambulances(self):
+        newly_available = []
+        for _, kind, (ambulance_id, version) in self.events.pop_due(self.current_time, AMBULANCE_EVENTS):
+            if version != self.event_versions.get(ambulance_id) or kind != HOSPITAL:
+                continue
+            newly_available.append(ambulance_id)
+            slot=self.fleet.slot[ambulance_id]
+            patient_id=self.fleet.patient_id[slot]
+            response_time=float(self.fleet.free_at[slot])
+            call_time=self.fleet.call_time[slot]
+            assignment_time=self.fleet.assignment_time[slot]
+            self.results_writer.write(TripRecord(patient_id, call_time, assignment_time, response_time, ambulance_id))
+            self.policy.after_delivery(self, ambulance_id, self.fleet.nodes[self.fleet.target[slot]], response_time)
+
+        if newly_available:
+            self.log.event(INFO, DISPATCH, self.current_time, "Ambulances %s now available and stationed accordingly", newly_available)
+            self.unpark_calls()
+
+    def process_queued_requests(self):
+        if self.batch_window is not None:
+            for _ in self.events.pop_due(self.current_time, (BATCH,)):
+                pass
+            if self.batch_due is not None and self.current_time >= self.batch_due:
+                self.dispatch_batch()
+            return
+        if not self.fleet.has_available() or not self.priority_queue:
+            return
+
+        self.log.event(INFO, QUEUE, self.current_time, "Processing queue. Queue Length: %s", len(self.priority_queue))
+        while self.priority_queue and self.fleet.has_available():
+            patient_id, item = self.priority_queue.peek(self.current_time)
+            acuity, enqueue_time = self.priority_queue.acuity(patient_id), self.priority_queue.enqueue_time(patient_id)
+            self.priority_queue.remove(patient_id)
+            patient_call, hospital_node, patient_type = item
+            self.log.event(DEBUG, QUEUE, self.current_time, "%s in process queued requests", patient_call)
+            if not self.dispatch_ambulance(patient_call, hospital_node, patient_type,patient_id):
+                # No free ambulance can reach the call (e.g. a closed road cut it off): park it so the
+                # calls behind it still go out; it is only retried once a road or the free fleet changes
+                self.priority_queue.remove(patient_id)
+                self.park_call(patient_id, item, enqueue_time, acuity)
+
+        self.log.event(INFO, QUEUE, self.current_time, "Remaining queue length: %s", len(self.priority_queue))
+
+    def park_call(self, patient_id, item, enqueue_time, acuity):
+        if patient_id not in self.stranded:
+            self.stranded.add(patient_id)
+            self.log.event(WARNING, QUEUE, self.current_time, "Patient %s at %s cannot be reached by a free ambulance, keeps waiting", patient_id, item[0][0])
+        self.parked[patient_id] = (item, enqueue_time, acuity)
+
+    def unpark_calls(self):
+        # Parked calls go back to the queue with their original enqueue time and acuity; calls with
+        # no hospital to go to stay parked
+        for patient_id, (item, enqueue_time, acuity) in list(self.parked.items()):
+            if item[1] is not None:
+                self.priority_queue.push(patient_id, item, enqueue_time, acuity)
+                del self.parked[patient_id]
+        if self.batch_window is not None and self.priority_queue:
+            self.batch_due = self.current_time
+
+    def hold_for_batch(self, patient_call, hospital_node, patient_type, patient_id):
+        # Batch mode: calls wait in the queue until the window opened by the oldest of them closes
+        self.priority_queue.push(patient_id, (patient_call, hospital_node, patient_type), self.determine_priority(patient_call[0], self.current_time), self.determine_acuity(patient_call))
+        if self.batch_due is None:
+            self.batch_due = self.current_time + self.batch_window
+            self.events.push(self.batch_due, BATCH, None)
+
+    def dispatch_batch(self):
+        # Pairs waiting calls with free ambulances so that the summed ambulance to patient to hospital
+        # time is minimal, instead of letting each call greedily take the best ambulance in turn
+        slots = self.fleet.available_slots()
+        if len(slots) and self.priority_queue:
+            self.fleet.sync_positions(slots, self.current_time)
+            # At most one call per free ambulance, taken in triage order
+            batch = []
+            while self.priority_queue and len(batch) < len(slots):
+                patient_id, item = self.priority_queue.peek(self.current_time)
+                batch.append((patient_id, item, self.priority_queue.acuity(patient_id), self.priority_queue.enqueue_time(patient_id)))
+                self.priority_queue.remove(patient_id)
+            patient_nodes = [self.travel_times.index[patient_call[0]] for _, (patient_call, _, _), _, _ in batch]
+            hospital_nodes = [self.travel_times.index[hospital_node] for _, (_, hospital_node, _), _, _ in batch]
+            dist = self.travel_times.dist
+            cost = dist[np.ix_(self.fleet.node[slots], patient_nodes)].T + dist[patient_nodes, hospital_nodes][:, None]
+            if self.profiler is not None:
+                self.profiler.count('distance_reads', cost.size + len(batch))
+            self.log.event(INFO, QUEUE, self.current_time, "Batch assignment of %s calls to %s free ambulances", len(batch), len(slots))
+
+            assigned = set()
+            for row, col in solve_assignment(cost):
+                patient_id, (patient_call, hospital_node, patient_type), _, _ = batch[row]
+                ambulance_id = self.fleet.ids[slots[col]]
+                total_cost = float(cost[row, col])
+                self.mark_ambulance_unavailable(ambulance_id, hospital_node, total_cost, patient_call, patient_id)
+                if self.log.enabled(INFO, DISPATCH):
+                    self.log.event(INFO, DISPATCH, self.current_time, "Ambulance %s dispatched to %s for patient %s, will be free at %s", ambulance_id, patient_call[0], patient_id, self.fleet.free_at[slots[col]])
+                assigned.add(row)
+            reachable = np.isfinite(cost).any(axis=1)
+            for row, (patient_id, item, acuity, enqueue_time) in enumerate(batch):
+                if row in assigned:
+                    continue
+                if reachable[row]:
+                    self.priority_queue.push(patient_id, item, enqueue_time, acuity)
+                else:
+                    self.park_call(patient_id, item, enqueue_time, acuity)
+        # Calls left over stay due, they go out as soon as an ambulance frees up
+        self.batch_due = self.current_time if self.priority_queue else None
+
+    def determine_priority(self, patient_node, time):
+        return time  # Negative time to prioritize earlier requests
+
+    def determine_acuity(self, patient_call):
+        # A call whose type names a configured acuity class is queued in it, any other in the default class
+        if patient_call[1] in self.priority_queue.classes:
+            return patient_call[1]
+        return self.priority_queue.default_acuity
+
+    def cancel_call(self, patient_id):
+        # Drops a waiting call in O(log n); a call that has not arrived yet is skipped when it does
+        if patient_id in self.priority_queue:
+            self.priority_queue.remove(patient_id)
+            return True
+        if patient_id in self.parked:
+            del self.parked[patient_id]
+            self.stranded.discard(patient_id)
+            return True
+        self.cancelled_calls.add(patient_id)
+        return False
+
+    def escalate_call(self, patient_id, acuity):
+        if patient_id in self.parked:
+            item, enqueue_time, _ = self.parked[patient_id]
+            self.parked[patient_id] = (item, enqueue_time, acuity)
+            return
+        self.priority_queue.reprioritize(patient_id, acuity=acuity)
+
+    def is_waiting(self, patient_id):
+        # Queued or parked
+        return patient_id in self.priority_queue or patient_id in self.parked
+
+    def schedule_road_update(self, time, u, v, weight):
+        # Road u-v takes `weight` from `time` on, float('inf') closes it
+        self.events.push(time, ROAD, (u, v, weight))
+
+    def apply_road_updates(self):
+        for _, _, (u, v, weight) in self.events.pop_due(self.current_time, (ROAD,)):
+            self.update_road(u, v, weight)
+
+    def update_road(self, u, v, weight):
+        old_weight = retime_road(self.graph, self.travel_times, self.traffic, u, v, weight)
+        self.road_changed(u, v, old_weight, weight)
+
+    def road_changed(self, u, v, old_weight, weight):
+        # The graph and travel times already carry the change (see retime_road); recomputes only what
+        # used the road: the station paths and the in-flight routes
+        self.road_changes.append((u, v, weight))
+        if self.geometry is not None:
+            self.geometry.road_changed(u, v, weight)
+        if self.traffic is not None:
+            self.travel_times = self.traffic.for_time(self.current_time)
+        self.log.event(INFO, MOVEMENT, self.current_time, "Road %s-%s travel time changed from %s to %s", u, v, old_weight, weight)
+        self.repair_station_paths(u, v, weight < old_weight)
+        self.reroute_ambulances(u, v)
+        self.unpark_calls()
+
+    def repair_station_paths(self, u, v, faster):
+        # A slower road only matters to hospitals whose station path drives it, a faster one can
+        # bring any hospital closer to another station
+        stations = [node for node in self.travel_times.nodes if node.startswith('A')]
+        station_rows = [self.travel_times.index[station] for station in stations]
+        for hospital, station_data in self.hospital_to_station.items():
+            if not faster and not path_uses_edge(station_data['travel_path'], u, v):
+                continue
+            distances = self.travel_times.dist[station_rows, self.travel_times.index[hospital]]
+            if self.profiler is not None:
+                self.profiler.count('distance_reads', len(station_rows))
+            if not np.isfinite(distances).any():
+                self.log.event(WARNING, MOVEMENT, self.current_time, "Hospital %s is cut off from every station", hospital)
+                continue
+            station = stations[int(np.argmin(distances))]
+            station_data.update(station=station, travel_time=float(distances.min()), travel_path=self.travel_times.path(hospital, station))
+
+    def reroute_ambulances(self, u, v):
+        # Routes that still drive the road are re-planned from the last node the ambulance passed;
+        # ambulances stranded by an earlier closure get another try on every road change
+        self.fleet.advance_to(self.current_time)
+        slots = set(int(slot) for slot in self.fleet.routes_using_edge(self.fleet.node_index[u], self.fleet.node_index[v]))
+        slots.update(np.flatnonzero((self.fleet.status == BUSY) & np.isinf(self.fleet.free_at)).tolist())
+        for slot in sorted(slots):
+            ambulance_id = self.fleet.ids[slot]
+            current_node = self.fleet.node_name(ambulance_id)
+            remaining = [self.fleet.nodes[k] for k in self.fleet.remaining_route(ambulance_id)]
+            patient_node = self.fleet.nodes[self.fleet.patient_node[slot]] if self.fleet.patient_node[slot] != NO_NODE else None
+            to_patient_leg = patient_node in remaining[1:]
+            try:
+                if to_patient_leg:
+                    # Still on the way to the patient
+                    to_patient, path, edge_times = self.route_leg(current_node, patient_node, self.current_time)
+                    _, path_on, times_on = self.route_leg(patient_node, remaining[-1], self.current_time + to_patient)
+                    path, edge_times = path[0:-1] + path_on, edge_times + times_on
+                else:
+                    _, path, edge_times = self.route_leg(current_node, remaining[-1], self.current_time)
+            except nx.NetworkXNoPath:
+                self.strand_ambulance(slot, to_patient_leg, u, v)
+                continue
+            self.fleet.set_route(ambulance_id, [self.fleet.node_index[node] for node in path], edge_times, self.current_time)
+            self.log.event(INFO, MOVEMENT, self.current_time, "Ambulance %s rerouted from %s via %s", ambulance_id, current_node, path)
+            if self.fleet.status[slot] == BUSY:
+                # The hospital arrival moves with the new route
+                self.fleet.free_at[slot] = self.current_time + sum(edge_times)
+                self.event_versions[ambulance_id] += 1
+                self.events.push(self.fleet.free_at[slot], HOSPITAL, (ambulance_id, self.event_versions[ambulance_id]))
+
+    def strand_ambulance(self, slot, to_patient_leg, u, v):
+        # No route is left for the rest of the trip. An ambulance returning to its station stops where
+        # it is; one that has not reached its patient gives the trip up and the call goes back to the
+        # queue under its original call time; one carrying a patient keeps its route and waits, with
+        # no hospital arrival, for a road change to open a way.
+        ambulance_id = self.fleet.ids[slot]
+        current_node = self.fleet.node_name(ambulance_id)
+        if self.fleet.status[slot] != BUSY:
+            self.log.event(WARNING, MOVEMENT, self.current_time, "No route around road %s-%s for ambulance %s, it waits at %s", u, v, ambulance_id, current_node)
+            self.fleet.clear_route(ambulance_id)
+            return
+        self.event_versions[ambulance_id] += 1  # Drops the pending hospital arrival
+        if to_patient_leg:
+            patient_id = self.fleet.patient_id[slot]
+            patient_call = (self.fleet.nodes[self.fleet.patient_node[slot]], self.fleet.call_type[slot], self.fleet.call_time[slot])
+            item = (patient_call, self.fleet.nodes[self.fleet.target[slot]], patient_call[1])
+            self.log.event(WARNING, MOVEMENT, self.current_time, "No route around road %s-%s for ambulance %s, patient %s goes back to the queue", u, v, ambulance_id, patient_id)
+            self.fleet.abort(ambulance_id, self.current_time)
+            self.priority_queue.push(patient_id, item, self.determine_priority(patient_call[0], patient_call[2]), self.determine_acuity(patient_call))
+        else:
+            if np.isfinite(self.fleet.free_at[slot]):
+                self.log.event(WARNING, MOVEMENT, self.current_time, "No route around road %s-%s for ambulance %s, stranded at %s with patient %s", u, v, ambulance_id, current_node, self.fleet.patient_id[slot])
+            # A route that never advances keeps it in place with its hospital as the destination
+            self.fleet.set_route(ambulance_id, [self.fleet.node[slot], self.fleet.target[slot]], [np.inf], self.current_time)
+            self.fleet.free_at[slot] = np.inf
+
+    def select_best_ambulance(self, nearby_ambulances, patient_node, hospital_node):
+        # Assume shortest path to patient plus path from patient to hospital determines best ambulance
+        min_total_cost = float('inf')
+        best_ambulance_id = None
+        try:
+            # The patient to hospital leg is the same for every candidate
+            cost_to_hospital = self.travel_times.distance(patient_node, hospital_node)
+        except nx.NetworkXNoPath:
+            return None, None
+        for ambulance_id, (ambulance_node, cost_to_patient, *_) in nearby_ambulances.items():
+            total_cost = cost_to_patient + cost_to_hospital
+            if total_cost < min_total_cost:
+                min_total_cost = total_cost
+                best_ambulance_id = ambulance_id
+
+        return best_ambulance_id, min_total_cost if best_ambulance_id else None
+
+    def edge_times(self, path):
+        # Travel time of each edge of a node path, under the traffic of the current time when it is on,
+        # so that tracked routes add up to the costs the travel time tables give
+        if self.traffic is not None:
+            return self.traffic.edge_weights(path, self.current_time)
+        return [self.graph[u][v]['weight'] for u, v in zip(path, path[1:])]
+
+    def route_leg(self, source, target, depart_time):
+        # (travel time, node path, edge times) of one leg, timed like the costs it replaces: from the
+        # current table, or edge by edge when traffic changes bucket on the way
+        path = self.travel_times.path(source, target)
+        edge_times = self.edge_times(path)
+        if self.traffic is not None and self.traffic.crosses_bucket(depart_time, depart_time + sum(edge_times)):
+            return self.traffic.route(source, target, depart_time)
+        return sum(edge_times), path, edge_times
+
+    def mark_ambulance_unavailable(self, ambulance_id, hospital_node, best_cost, patient_call, patient_id, to_patient_path=None):
+        patient_node = patient_call[0]
+        if self.traffic is not None and self.traffic.crosses_bucket(self.current_time, self.current_time + best_cost):
+            # The bucket's table assumes one multiplier for the whole trip; a trip running into the next
+            # bucket is timed edge by edge with the time-dependent search instead
+            ambulance_node = self.fleet.node_name(ambulance_id)
+            to_patient, path, edge_times = self.traffic.route(ambulance_node, patient_node, self.current_time)
+            to_hospital, path_on, times_on = self.traffic.route(patient_node, hospital_node, self.current_time + to_patient)
+            best_cost, path, edge_times = to_patient + to_hospital, path[0:-1] + path_on, edge_times + times_on
+        else:
+            # Every trip keeps its route to the patient and on to the hospital, so a road closure can
+            # find and reroute it; only the chosen ambulance's route is looked up, unless the
+            # candidate search already walked it
+            if to_patient_path is None:
+                to_patient_path = self.travel_times.path(self.fleet.node_name(ambulance_id), patient_node)
+            path = to_patient_path[0:-1] + self.travel_times.path(patient_node, hospital_node)
+            edge_times = self.edge_times(path)
+        self.stranded.discard(patient_id)
+        self.fleet.dispatch(ambulance_id, self.fleet.node_index[hospital_node], self.current_time + best_cost,
+                            patient_id, patient_call[2], self.current_time, self.fleet.node_index[patient_node], patient_call[1])
+        self.fleet.set_route(ambulance_id, [self.fleet.node_index[node] for node in path], edge_times, self.current_time)
+        self.event_versions[ambulance_id] = self.event_versions.get(ambulance_id, 0) + 1
+        self.events.push(self.current_time + best_cost, HOSPITAL, (ambulance_id, self.event_versions[ambulance_id]))
+
+    def start(self, patient_calls, time_step=1, horizon=None):
+        # patient_calls is a {id: (node, type, time)} dict or a time-ordered call source (see call_source.py)
+        if isinstance(patient_calls, dict):
+            if horizon is None:
+                # Determine the last call time to know when to stop processing new calls.
+                horizon = max(call[2] for id,call in patient_calls.items())+1000
+            patient_calls = calls_from_dict(patient_calls)
+        # Without a horizon a streamed run lasts until the source is exhausted and every trip is done
+        self.last_call_time = horizon if horizon is not None else float('inf')
+        self.call_source = iter(patient_calls)
+        # Next-event loop: jump straight to the next call arrival or ambulance event instead of
+        # stepping through every time unit. time_step=None uses exact event times.
+        self.events.time_step = time_step
+        self.pull_next_call()
+
+    def next_event_time(self):
+        # Time of the next event within the horizon, None once the run is over
+        time = self.events.next_time()
+        return time if time is not None and time <= self.last_call_time else None
+
+    def step(self, time):
+        self.current_time = time
+        if self.traffic is not None:
+            # Cheap while the clock stays in the same bucket, a table is only built on a cache miss
+            self.travel_times = self.traffic.for_time(self.current_time)
+        self.apply_road_updates()
+        # Process new calls due at the current time
+        self.process_calls_and_queue()
+        # Update the status of ambulances (e.g., make available ones that have completed their tasks)
+        self.update_available_ambulances()
+        # Try to dispatch any remaining queued requests
+        self.process_queued_requests()
+
+    def run_simulation(self, patient_calls, time_step=1, horizon=None):
+        self.start(patient_calls, time_step, horizon)
+        self.resume()
+
+    def resume(self, until=None):
+        # Main simulation loop. With `until` it stops before the first event after that time, where
+        # the run can be snapshotted (see snapshot.py) and continued by calling resume again.
+        while self.next_event_time() is not None and (until is None or self.next_event_time() <= until):
+            self.step(self.next_event_time())
+        self.results_writer.flush()
+    def is_queue_empty(self):
+        # Check if there are no more requests in the priority queue or parked
+        return len(self.priority_queue) == 0 and not self.parked
+    def pull_next_call(self):
+        # Only the next call of the source is scheduled, so memory does not grow with the number of calls
+        for patient_id, call in self.call_source:
+            self.events.push(call[2], CALL, (patient_id, call))
+            return
+
+    def process_calls_and_queue(self):
+        # Ambulance events due now go first, as the first dispatch of a tick used to free them
+        self.update_available_ambulances()
+        for _, _, (patient_id, call) in self.events.pop_due(self.current_time, (CALL,)):
+            self.pull_next_call()
+            if patient_id in self.cancelled_calls:
+                self.cancelled_calls.discard(patient_id)
+                continue
+            call = self.locate_call(call)
+            patient_node, hospital_node, _ = call
+            hospital_node = self.assignments.get(patient_node)  # Get hospital node from assignments
+            if hospital_node is None:
+                # No hospital can be reached from the patient: the call is parked with no destination
+                # instead of being routed, and stays parked (see unpark_calls)
+                self.log.event(WARNING, QUEUE, self.current_time, "No hospital is reachable from %s, patient %s keeps waiting", patient_node, patient_id)
+                self.stranded.add(patient_id)
+                self.park_call(patient_id, (call, None, _), self.determine_priority(patient_node, self.current_time), self.determine_acuity(call))
+            elif self.batch_window is not None:
+                self.hold_for_batch(call, hospital_node, _, patient_id)
+            else:
+                self.dispatch_ambulance(call, hospital_node, _, patient_id)
+
+
+class PolicyComparison:
+    # One dispatcher per policy over a single pass of a shared call stream. The graph, routing and
+    # traffic tables, hospital assignments and station paths are loaded once, calls are generated
+    # once and handed to every dispatcher, and scheduled road changes are applied to the shared
+    # routing data once before each dispatcher repairs its own routes. What is shared is memory and
+    # setup: every policy still runs its own candidate search over its own fleet for each call, so
+    # the pass takes about as long as running the policies one after another.
+    def __init__(self, graph, ambulance_data, policies, travel_times=None, assignments=None,
+                 hospital_to_station=None, results_writers=None, log=None):
+        travel_times = travel_times if travel_times is not None else build_travel_times(graph)
+        if hospital_to_station is None:
+            hospital_to_station = hospital_to_station_mapping(graph)
+        results_writers = results_writers or {}
+        self.graph = graph
+        self.travel_times = travel_times
+        self.traffic = None
+        self.events = EventQueue()
+        self.current_time = 0
+        # Station paths are repaired per dispatcher on road changes, so each gets its own copy
+        self.dispatchers = {
+            name: AmbulanceDispatch(graph, ambulance_data, travel_times, results_writers.get(name), log, policy,
+                                    assignments, copy.deepcopy(hospital_to_station))
+            for name, policy in policies.items()
+        }
+
+    def schedule_road_update(self, time, u, v, weight):
+        self.events.push(time, ROAD, (u, v, weight))
+
+    def run(self, patient_calls, time_step=1, horizon=None):
+        if isinstance(patient_calls, dict):
+            if horizon is None:
+                horizon = max(call[2] for call in patient_calls.values()) + 1000
+            patient_calls = calls_from_dict(patient_calls)
+        # The dispatchers move in lockstep, so tee only buffers the few calls some have already pulled
+        streams = itertools.tee(patient_calls, len(self.dispatchers))
+        for dispatcher, stream in zip(self.dispatchers.values(), streams):
+            dispatcher.traffic = self.traffic
+            dispatcher.start(stream, time_step, horizon)
+        self.events.time_step = time_step
+
+        dispatchers = list(self.dispatchers.values())
+        while True:
+            times = [dispatcher.next_event_time() for dispatcher in dispatchers]
+            pending = [time for time in times if time is not None]
+            if not pending:
+                break
+            road_time = self.events.next_time()
+            self.current_time = min(pending) if road_time is None else min(min(pending), road_time)
+            for _, _, (u, v, weight) in self.events.pop_due(self.current_time, (ROAD,)):
+                old_weight = retime_road(self.graph, self.travel_times, self.traffic, u, v, weight)
+                for dispatcher in dispatchers:
+                    dispatcher.current_time = self.current_time
+                    dispatcher.road_changed(u, v, old_weight, weight)
+            for dispatcher, time in zip(dispatchers, times):
+                if time == self.current_time:
+                    dispatcher.step(time)
+        for dispatcher in dispatchers:
+            dispatcher.results_writer.flush()
+        return self.dispatchers
+
+
+
+if __name__ == "__main__":
+    # Example run: every return policy side by side over the calls of simulation_rp.py
+    from artifact_store import open_store
+    store = open_store('graph_structure.txt')
+    graph = store.graph().to_networkx()
+    ambulance_data = {i + 1: (station, None, station, None, None) for i, station in enumerate(['A210', 'A211', 'A212', 'A213', 'A214'])}
+    patient_calls = {1: ('E28', 1, 5), 2: ('E8', 1, 30), 3: ('E31', 1, 60), 4: ('E37', 1, 100), 5: ('E4', 1, 150),
+                     6: ('E7', 1, 210), 7: ('E6', 2, 280), 8: ('E107', 2, 360), 9: ('E108', 3, 450), 10: ('E10', 4, 550)}
+    comparison = PolicyComparison(graph, ambulance_data, POLICIES, store.travel_times(), store.hospital_assignments(),
+                                  store.station_mapping())
+    for name, dispatcher in comparison.run(patient_calls).items():
+        records = dispatcher.results_writer.records
+        mean = sum(record.hospital_arrival - record.call_time for record in records) / len(records)
+        print(f"{name}: {len(records)} trips, mean call to hospital time {mean:.1f}")
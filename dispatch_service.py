@@ -0,0 +1,358 @@
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import networkx as nx
+import numpy as np
+from event_queue import CALL
+from fleet_state import BUSY
+
+# The dispatch engine as a live decision service for training exercises. Calls are posted as JSON
+# over a small HTTP/1.1 front end (TCP or Unix socket); the reply carries the chosen ambulance and
+# its ETA, and status changes (dispatches, deliveries, queued calls) are pushed to every client
+# of GET /events as server-sent events. The engine runs on its own worker thread, so routing and
+# table rebuilds never block the event loop, and one job at a time touches its state. A clock
+# maps simulation minutes to wall time; SimulatedClock only moves when told to, which is how
+# tests/test_dispatch_service.py drives the service.
+#
+#   POST /calls             {"node": "E28", "type": 1, "id": optional}  -> decision
+#                           {"x": 410.0, "y": 96.5, ...} snaps the call to the nearest E node
+#   POST /calls/<id>/cancel                                             -> {"cancelled": bool}
+#   POST /roads             {"u": "E1", "v": "E2", "weight": 12.5 or null to close}
+#   GET  /status            fleet, queue and decision latency percentiles
+#   GET  /events            text/event-stream of status changes
+
+LATENCY_WINDOW = 4096  # decisions kept for the latency percentiles in /status
+MAX_BODY = 1 << 16
+
+
+class SimulatedClock:
+    # Simulation time that only moves with advance_to(), for tests and replays
+    def __init__(self, time=0.0):
+        self.time = time
+        self.moved = asyncio.Condition()
+
+    def now(self):
+        return self.time
+
+    async def advance_to(self, time):
+        async with self.moved:
+            self.time = max(self.time, time)
+            self.moved.notify_all()
+
+    async def sleep_until(self, time):
+        async with self.moved:
+            await self.moved.wait_for(lambda: self.time >= time)
+
+
+class WallClock:
+    # Simulation time running `speed` minutes per wall-clock second from `start`; speed=1/60 is real time
+    def __init__(self, speed=1 / 60, start=0.0):
+        self.speed = speed
+        self.start = start
+        self.origin = time.monotonic()
+
+    def now(self):
+        return self.start + (time.monotonic() - self.origin) * self.speed
+
+    async def sleep_until(self, time):
+        while self.now() < time:
+            await asyncio.sleep((time - self.now()) / self.speed)
+
+
+class DispatchService:
+    def __init__(self, dispatcher, clock=None):
+        self.dispatcher = dispatcher
+        self.clock = clock if clock is not None else WallClock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='dispatch-engine')
+        self.lock = asyncio.Lock()
+        self.changed = asyncio.Event()  # new events were scheduled, the driver re-reads the next event time
+        self.subscribers = set()
+        self.pending = []  # status changes of the running engine job, published when it returns
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.ids = itertools.count(1)
+        self.used_ids = set()  # every call id taken so far, by a client or automatically
+        # Same instance-attribute hooks as profiler.Profiler: every assignment and delivery is reported
+        mark_ambulance_unavailable = dispatcher.mark_ambulance_unavailable
+
+        def report_assignment(ambulance_id, hospital_node, best_cost, patient_call, patient_id, *args):
+            mark_ambulance_unavailable(ambulance_id, hospital_node, best_cost, patient_call, patient_id, *args)
+            self.pending.append(self.assignment(ambulance_id, patient_call[0], hospital_node, patient_id))
+        dispatcher.mark_ambulance_unavailable = report_assignment
+        results_writer = dispatcher.results_writer
+        write = results_writer.write
+
+        def report_delivery(record):
+            write(record)
+            self.pending.append({'event': 'delivered', 'patient_id': record.patient_id, 'ambulance': record.ambulance_id,
+                                 'time': float(record.hospital_arrival)})
+        results_writer.write = report_delivery
+        # Live calls are pushed one by one at their exact time
+        dispatcher.start(iter(()), time_step=None)
+
+    def assignment(self, ambulance_id, patient_node, hospital_node, patient_id):
+        # ETA at the patient: from the tracked route when there is one, else the hospital arrival
+        # minus the patient to hospital leg
+        fleet, slot = self.dispatcher.fleet, self.dispatcher.fleet.slot[ambulance_id]
+        free_at = float(fleet.free_at[slot])
+        at_patient = np.flatnonzero(fleet.route(ambulance_id) == fleet.node_index[patient_node])
+        if len(at_patient):
+            eta = float(fleet.route_arrival[fleet.route_start[slot] + at_patient[0]])
+        else:
+            try:
+                eta = free_at - self.dispatcher.travel_times.distance(patient_node, hospital_node)
+            except (nx.NetworkXNoPath, KeyError):
+                eta = free_at
+        return {'event': 'dispatched', 'patient_id': patient_id, 'ambulance': ambulance_id, 'node': patient_node,
+                'hospital': hospital_node, 'eta': eta, 'free_at': free_at, 'time': float(self.dispatcher.current_time)}
+
+    async def engine(self, job=None, *args):
+        # Runs job on the engine thread after bringing the simulation up to the clock, then
+        # publishes what changed; without a job it only fires the events that are due
+        async with self.lock:
+            now = self.clock.now()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(self.executor, self.run_job, now, job, args)
+            finally:
+                events, self.pending = self.pending, []
+                for event in events:
+                    self.publish(event)
+                self.changed.set()
+
+    def run_job(self, now, job, args):
+        dispatcher = self.dispatcher
+        if job is None:
+            dispatcher.resume(until=now)
+            return None
+        # Events due exactly now are left to the job's own step, which handles them together with a
+        # new call in the same order as run_simulation does
+        while dispatcher.next_event_time() is not None and dispatcher.next_event_time() < now:
+            dispatcher.step(dispatcher.next_event_time())
+        dispatcher.current_time = max(dispatcher.current_time, now)
+        return job(*args)
+
+    def publish(self, event):
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+    async def drive(self):
+        # Fires ambulance and road events as the clock reaches them
+        while True:
+            self.changed.clear()
+            async with self.lock:
+                next_time = self.dispatcher.next_event_time()
+            waits = [asyncio.ensure_future(self.changed.wait())]
+            if next_time is not None:
+                waits.append(asyncio.ensure_future(self.clock.sleep_until(next_time)))
+            _, pending = await asyncio.wait(waits, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+            if next_time is not None and self.clock.now() >= next_time:
+                await self.engine()
+
+    # Requests
+
+    async def submit_call(self, node, patient_type=1, patient_id=None):
+        start = time.perf_counter()
+        decision = await self.engine(self.take_call, node, patient_type, patient_id)
+        self.latencies.append(time.perf_counter() - start)
+        return decision
+
+    def take_call(self, node, patient_type, patient_id):
+        dispatcher = self.dispatcher
+        if not isinstance(node, str):
+            node = dispatcher.locate_call((node,))[0]
+        if node not in dispatcher.fleet.node_index:
+            raise ValueError(f"unknown node {node}")
+        # A call id is never reused: a client's id may not repeat any earlier one, and automatic ids
+        # skip the ones clients have taken
+        if patient_id is None:
+            patient_id = next(i for i in self.ids if i not in self.used_ids)
+        elif patient_id in self.used_ids:
+            raise ValueError(f"call id {patient_id} is already in use")
+        self.used_ids.add(patient_id)
+        now = dispatcher.current_time
+        dispatcher.events.push(now, CALL, (patient_id, (node, patient_type, now)))
+        dispatched = len(self.pending)
+        dispatcher.step(now)
+        for event in self.pending[dispatched:]:
+            if event['event'] == 'dispatched' and event['patient_id'] == patient_id:
+                return event
+        event = {'event': 'queued', 'patient_id': patient_id, 'node': node, 'time': float(now),
+                 'waiting': len(dispatcher.priority_queue) + len(dispatcher.parked)}
+        self.pending.append(event)
+        return event
+
+    async def cancel_call(self, patient_id):
+        # Only a waiting call can be cancelled: live calls have all arrived, and an ambulance on its way stays on it
+        def cancel():
+            return self.dispatcher.is_waiting(patient_id) and self.dispatcher.cancel_call(patient_id)
+        return {'patient_id': patient_id, 'cancelled': await self.engine(cancel)}
+
+    async def update_road(self, u, v, weight):
+        def update():
+            if not self.dispatcher.graph.has_edge(u, v):
+                raise ValueError(f"no road {u}-{v}")
+            self.dispatcher.update_road(u, v, weight)
+            return {'event': 'road', 'u': u, 'v': v, 'weight': weight if np.isfinite(weight) else None,
+                    'time': float(self.dispatcher.current_time)}
+        event = await self.engine(update)
+        self.publish(event)
+        return event
+
+    async def status(self):
+        def snapshot():
+            dispatcher = self.dispatcher
+            fleet = dispatcher.fleet
+            fleet.advance_to(dispatcher.current_time)
+            ambulances = [{'id': fleet.ids[i], 'busy': bool(fleet.status[i] == BUSY), 'node': fleet.nodes[fleet.node[i]],
+                           'patient_id': fleet.patient_id[i],
+                           'free_at': float(fleet.free_at[i]) if fleet.status[i] == BUSY else None}
+                          for i in range(len(fleet))]
+            return {'time': float(dispatcher.current_time), 'waiting': len(dispatcher.priority_queue) + len(dispatcher.parked), 'ambulances': ambulances}
+        status = await self.engine(snapshot)
+        if self.latencies:
+            latencies = np.array(self.latencies) * 1e6
+            status['decision_us'] = {'p50': float(np.percentile(latencies, 50)), 'p99': float(np.percentile(latencies, 99))}
+        return status
+
+    # HTTP front end
+
+    async def serve(self, host='127.0.0.1', port=8080, unix_path=None):
+        if unix_path is not None:
+            return await asyncio.start_unix_server(self.handle, path=unix_path)
+        return await asyncio.start_server(self.handle, host, port)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await read_request(reader)
+                if request is None:
+                    break
+                method, path, body = request
+                if method == 'GET' and path == '/events':
+                    await self.stream_events(reader, writer)
+                    break
+                try:
+                    code, reply = 200, await self.route(method, path, body)
+                except (ValueError, KeyError, TypeError) as e:
+                    code, reply = 400, {'error': str(e)}
+                write_response(writer, code, reply)
+                await writer.drain()
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        parts = path.strip('/').split('/')
+        if method == 'POST' and parts == ['calls']:
+            location = body['node'] if 'node' in body else (float(body['x']), float(body['y']))
+            return await self.submit_call(location, body.get('type', 1), body.get('id'))
+        if method == 'POST' and len(parts) == 3 and parts[0] == 'calls' and parts[2] == 'cancel':
+            patient_id = int(parts[1]) if parts[1].isdigit() else parts[1]
+            return await self.cancel_call(patient_id)
+        if method == 'POST' and parts == ['roads']:
+            weight = body.get('weight')
+            return await self.update_road(body['u'], body['v'], float('inf') if weight is None else float(weight))
+        if method == 'GET' and parts == ['status']:
+            return await self.status()
+        raise ValueError(f"no route {method} {path}")
+
+    async def stream_events(self, reader, writer):
+        # Until the client hangs up, which is the only thing it sends after the request
+        queue = asyncio.Queue()
+        self.subscribers.add(queue)
+        closed = asyncio.ensure_future(reader.read())
+        try:
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n")
+            await writer.drain()
+            while True:
+                event = asyncio.ensure_future(queue.get())
+                await asyncio.wait((event, closed), return_when=asyncio.FIRST_COMPLETED)
+                if not event.done():
+                    event.cancel()
+                    break
+                event = event.result()
+                writer.write(f"event: {event['event']}\ndata: {json.dumps(to_json(event), allow_nan=False)}\n\n".encode())
+                await writer.drain()
+        finally:
+            closed.cancel()
+            self.subscribers.discard(queue)
+
+
+def to_json(value):
+    # Reply data in strict JSON types: numpy scalars become Python numbers, infinite times null
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+async def read_request(reader):
+    # (method, path, JSON body or {}) of one HTTP/1.1 request, None once the client is done
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    method, target, _ = line.decode('latin-1').split(' ', 2)
+    length = 0
+    while True:
+        header = await reader.readline()
+        if header in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = header.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    if length > MAX_BODY:
+        raise ConnectionError("request body too large")
+    body = await reader.readexactly(length) if length else b''
+    return method.upper(), urlsplit(target).path, json.loads(body) if body else {}
+
+
+def write_response(writer, code, reply):
+    body = json.dumps(to_json(reply), allow_nan=False).encode()
+    reason = 'OK' if code == 200 else 'Bad Request'
+    writer.write(f"HTTP/1.1 {code} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode() + body)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live ambulance dispatch service")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--policy', default='returning')
+    parser.add_argument('--stations', nargs='+', default=None, help="one ambulance per listed station (default: every A node)")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--unix', default=None, help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--speed', type=float, default=1 / 60, help="simulated minutes per wall-clock second")
+    args = parser.parse_args()
+
+    from artifact_store import open_store
+    from traffic import load_traffic
+    from results_writer import TextResultsWriter
+    from event_log import EventLog, INFO
+    from dispatch_engine import AmbulanceDispatch, POLICIES
+    store = open_store(args.graph)
+
+    stations = args.stations or [node for node in store.node_names() if node.startswith('A')]
+    dispatcher = AmbulanceDispatch(store.graph().to_networkx(), {i + 1: (station, None, station, None, None) for i, station in enumerate(stations)},
+                                   store.travel_times(), TextResultsWriter("results_service.txt", chunk_size=1), EventLog(level=INFO),
+                                   POLICIES[args.policy], store.hospital_assignments(), store.station_mapping())
+    dispatcher.traffic = load_traffic(store.graph(), args.graph)
+
+    async def main():
+        service = DispatchService(dispatcher, WallClock(args.speed))
+        server = await service.serve(args.host, args.port, args.unix)
+        print("Dispatch service listening on", args.unix or f"http://{args.host}:{args.port}")
+        async with server:
+            await asyncio.gather(server.serve_forever(), service.drive())
+    asyncio.run(main())
@@ -0,0 +1,81 @@
+import pickle
+import struct
+import sys
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+OFF = 100
+
+DISPATCH = 'dispatch'
+MOVEMENT = 'movement'
+QUEUE = 'queue'
+CATEGORIES = (DISPATCH, MOVEMENT, QUEUE)
+
+
+class RingBuffer:
+    # Keeps the last `capacity` events unformatted (time, level, category, message, args) for
+    # post-mortem debugging; dump() writes them to a compact binary file
+    def __init__(self, capacity=65536):
+        self.capacity = capacity
+        self.events = [None] * capacity
+        self.next = 0
+        self.count = 0
+
+    def append(self, event):
+        self.events[self.next] = event
+        self.next = (self.next + 1) % self.capacity
+        self.count += 1
+
+    def recent(self):
+        if self.count < self.capacity:
+            return self.events[:self.count]
+        return self.events[self.next:] + self.events[:self.next]
+
+    def dump(self, file_path):
+        # Fixed-size record header (time, level, category index) followed by the pickled message and args
+        with open(file_path, 'wb') as f:
+            for time, level, category, message, args in self.recent():
+                payload = pickle.dumps((message, args), protocol=pickle.HIGHEST_PROTOCOL)
+                f.write(struct.pack('<dBBI', float(time), level, CATEGORIES.index(category), len(payload)))
+                f.write(payload)
+
+
+def load_ring_dump(file_path):
+    events = []
+    record = struct.Struct('<dBBI')
+    with open(file_path, 'rb') as f:
+        while True:
+            header = f.read(record.size)
+            if len(header) < record.size:
+                break
+            time, level, category, length = record.unpack(header)
+            message, args = pickle.loads(f.read(length))
+            events.append((time, level, CATEGORIES[category], message, args))
+    return events
+
+
+def format_event(time, level, category, message, args):
+    return f"{time}: [{category}] {message % args if args else message}"
+
+
+class EventLog:
+    # Leveled, categorised trace of the dispatch loop. Messages use %-style arguments and are only
+    # formatted when the event passes the stream threshold, so a disabled level costs one comparison.
+    def __init__(self, level=WARNING, categories=CATEGORIES, stream=None, ring_capacity=None, ring_level=DEBUG):
+        self.stream = stream if stream is not None else sys.stdout
+        self.ring = RingBuffer(ring_capacity) if ring_capacity else None
+        self.stream_levels = {category: level if category in categories else OFF for category in CATEGORIES}
+        self.ring_level = ring_level if self.ring is not None else OFF
+        self.thresholds = {category: min(self.stream_levels[category], self.ring_level) for category in CATEGORIES}
+
+    def enabled(self, level, category):
+        return level >= self.thresholds[category]
+
+    def event(self, level, category, time, message, *args):
+        if level < self.thresholds[category]:
+            return
+        if level >= self.ring_level:
+            self.ring.append((time, level, category, message, args))
+        if level >= self.stream_levels[category]:
+            self.stream.write(format_event(time, level, category, message, args) + '\n')
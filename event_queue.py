@@ -0,0 +1,46 @@
+import heapq
+import itertools
+import math
+from sequence_counter import SequenceCounter
+
+# Event kinds handled by AmbulanceDispatch.run_simulation
+# Ambulance positions along their routes are not events: FleetState bisects the route's
+# cumulative arrival times when a dispatch needs them.
+CALL = 'call'
+HOSPITAL = 'hospital'    # ambulance reached the hospital and becomes available
+BATCH = 'batch'          # batching window closed, waiting calls are assigned jointly
+ROAD = 'road'            # scheduled road closure or travel time change
+AMBULANCE_EVENTS = (HOSPITAL,)
+# Order of kinds sharing a timestamp: road changes apply first, ambulance events free ambulances
+# before the calls of that time are dispatched (as the old tick loop did), batch wake-ups come last
+EVENT_RANKS = {ROAD: 0, HOSPITAL: 1, CALL: 2, BATCH: 3}
+
+
+class EventQueue(SequenceCounter):
+    def __init__(self, time_step=1):
+        # time_step=1 fires events on the same integer grid as the old 1-unit tick loop,
+        # time_step=None fires them at their exact (fractional) timestamps
+        self.time_step = time_step
+        self.events = []
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.events)
+
+    def snap(self, time):
+        if not self.time_step:
+            return time
+        return math.ceil(time / self.time_step) * self.time_step
+
+    def push(self, time, kind, payload):
+        rank = EVENT_RANKS[kind]
+        heapq.heappush(self.events, (self.snap(time), rank, next(self.counter), kind, payload))
+
+    def next_time(self):
+        return self.events[0][0] if self.events else None
+
+    def pop_due(self, time, kinds):
+        # Lazy so that events pushed while the caller handles one are seen in the same pass
+        while self.events and self.events[0][0] <= time and self.events[0][3] in kinds:
+            event_time, _, _, kind, payload = heapq.heappop(self.events)
+            yield event_time, kind, payload
@@ -0,0 +1,55 @@
+import heapq
+
+
+class FacilityIndex:
+    # Voronoi-style labelling of a road graph: for every node, the nearest facility (station,
+    # hospital, ...) by travel time, the distance to it and the next node on the way there.
+    # Built with one multi-source Dijkstra seeded from all facilities, O((V+E) log V) in total.
+    # Ties between facilities at the same distance go to the one listed first.
+    def __init__(self, facilities, nearest, dist, pred):
+        self.facilities = facilities
+        self.nearest_facility = nearest  # node -> facility
+        self.dist = dist                 # node -> travel time to that facility
+        self.pred = pred                 # node -> next node towards the facility (None at the facility)
+
+    @classmethod
+    def build(cls, graph, facilities):
+        facilities = list(facilities)
+        nearest, dist, pred, rank = {}, {}, {}, {}
+        heap = []
+        for i, facility in enumerate(facilities):
+            nearest[facility], dist[facility], pred[facility], rank[facility] = facility, 0.0, None, i
+            heap.append((0.0, i, facility))
+        heapq.heapify(heap)
+        done = set()
+        while heap:
+            d, r, node = heapq.heappop(heap)
+            if node in done:
+                continue
+            done.add(node)
+            facility = nearest[node]
+            for neighbor, data in graph.adj[node].items():
+                nd = d + data['weight']
+                if (nd, r) < (dist.get(neighbor, float('inf')), rank.get(neighbor, r)):
+                    nearest[neighbor], dist[neighbor], pred[neighbor], rank[neighbor] = facility, nd, node, r
+                    heapq.heappush(heap, (nd, r, neighbor))
+        return cls(facilities, nearest, dist, pred)
+
+    def __contains__(self, node):
+        return node in self.nearest_facility
+
+    def nearest(self, node):
+        # (facility, travel time), raises KeyError for a node that cannot reach any facility
+        return self.nearest_facility[node], self.dist[node]
+
+    def path(self, node):
+        # node -> ... -> nearest facility
+        path = []
+        while node is not None:
+            path.append(node)
+            node = self.pred[node]
+        return path
+
+    def assignments(self, nodes):
+        # {node: nearest facility} for the reachable ones among `nodes`
+        return {node: self.nearest_facility[node] for node in nodes if node in self.nearest_facility}
@@ -0,0 +1,215 @@
+import numpy as np
+
+AVAILABLE = 0
+BUSY = 1
+NO_NODE = -1
+
+
+class FleetState:
+    # Struct-of-arrays state for the whole fleet, one slot per ambulance. Node ids index into `nodes`.
+    # Routes live in one shared pool: slot i drives route_nodes[route_start[i]:route_end[i]], reaching
+    # each node at the matching route_arrival time after an edge of route_leg; cursor is its position.
+    def __init__(self, ambulance_ids, nodes):
+        self.nodes = list(nodes)
+        self.node_index = {node: i for i, node in enumerate(self.nodes)}
+        self.ids = list(ambulance_ids)
+        self.slot = {ambulance_id: i for i, ambulance_id in enumerate(self.ids)}
+        n = len(self.ids)
+        self.status = np.full(n, AVAILABLE, dtype=np.int8)
+        self.node = np.full(n, NO_NODE, dtype=np.int32)       # current node
+        self.target = np.full(n, NO_NODE, dtype=np.int32)     # hospital while busy, station while returning
+        self.base = np.full(n, NO_NODE, dtype=np.int32)       # hospital the ambulance last delivered to
+        self.cursor = np.full(n, -1, dtype=np.int32)          # index of the current node in the route
+        self.leg_start = np.zeros(n)                          # time the current leg started
+        self.free_at = np.full(n, np.inf)                     # time a busy ambulance reaches the hospital
+        self.available_seq = np.zeros(n, dtype=np.int64)      # order in which ambulances became available
+        self.seq = n
+        # Trip being served by a busy ambulance, kept as the caller's objects so results print unchanged
+        self.patient_id = np.empty(n, dtype=object)
+        self.patient_node = np.full(n, NO_NODE, dtype=np.int32)
+        self.call_type = np.empty(n, dtype=object)
+        self.call_time = np.empty(n, dtype=object)
+        self.assignment_time = np.empty(n, dtype=object)
+        # Shared route pool
+        self.route_start = np.zeros(n, dtype=np.int64)
+        self.route_end = np.zeros(n, dtype=np.int64)
+        self.route_nodes = np.empty(max(64, 16 * n), dtype=np.int32)
+        self.route_arrival = np.empty(max(64, 16 * n))
+        self.route_leg = np.empty(max(64, 16 * n))
+        self.pool_used = 0
+
+    @classmethod
+    def from_ambulance_data(cls, ambulance_data, nodes):
+        # ambulance_data: {id: (station, hospital or None, current node, path to station, time)}
+        fleet = cls(list(ambulance_data), nodes)
+        for i, (station, hospital, current_node, _, time) in enumerate(ambulance_data.values()):
+            fleet.node[i] = fleet.node_index[current_node]
+            fleet.target[i] = fleet.node_index[station]
+            if hospital:
+                fleet.base[i] = fleet.node_index[hospital]
+            fleet.leg_start[i] = time or 0
+            fleet.available_seq[i] = i
+        return fleet
+
+    def __len__(self):
+        return len(self.ids)
+
+    def node_name(self, ambulance_id):
+        return self.nodes[self.node[self.slot[ambulance_id]]]
+
+    # Queries
+
+    def available_slots(self):
+        # Slots of available ambulances, in the order they became available
+        slots = np.flatnonzero(self.status == AVAILABLE)
+        return slots[np.argsort(self.available_seq[slots], kind='stable')]
+
+    def available_ids(self):
+        return [self.ids[i] for i in self.available_slots()]
+
+    def has_available(self):
+        return bool((self.status == AVAILABLE).any())
+
+    def next_free(self):
+        # (ambulance id, time) of the busy ambulance that reaches its hospital first, or None
+        busy = np.flatnonzero(self.status == BUSY)
+        if not len(busy):
+            return None
+        i = busy[np.argmin(self.free_at[busy])]
+        return self.ids[i], float(self.free_at[i])
+
+    def route(self, ambulance_id):
+        i = self.slot[ambulance_id]
+        return self.route_nodes[self.route_start[i]:self.route_end[i]]
+
+    def remaining_route(self, ambulance_id):
+        # From the current node to the end of the route
+        i = self.slot[ambulance_id]
+        return self.route_nodes[self.route_start[i] + max(self.cursor[i], 0):self.route_end[i]]
+
+    def routes_using_edge(self, a, b):
+        # Slots whose remaining route still drives road a-b, in either direction
+        slots = []
+        for i in np.flatnonzero(self.cursor >= 0):
+            route = self.remaining_route(self.ids[i])
+            if (((route[:-1] == a) & (route[1:] == b)) | ((route[:-1] == b) & (route[1:] == a))).any():
+                slots.append(i)
+        return slots
+
+    # Updates
+
+    def set_route(self, ambulance_id, route, edge_times, start_time):
+        # route: node ids starting at the current node, edge_times: travel time of each edge
+        i = self.slot[ambulance_id]
+        length = len(route)
+        self.reserve(length)
+        start = self.pool_used
+        self.route_nodes[start:start + length] = route
+        self.route_leg[start] = 0.0
+        self.route_leg[start + 1:start + length] = edge_times
+        self.route_arrival[start:start + length] = start_time + np.cumsum(self.route_leg[start:start + length])
+        self.route_start[i], self.route_end[i] = start, start + length
+        self.pool_used += length
+        self.cursor[i] = 0
+        self.node[i] = route[0]
+        self.leg_start[i] = start_time
+
+    def clear_route(self, ambulance_id):
+        i = self.slot[ambulance_id]
+        self.route_start[i] = self.route_end[i] = 0
+        self.cursor[i] = -1
+
+    def dispatch(self, ambulance_id, hospital, free_at, patient_id, call_time, assignment_time, patient_node=NO_NODE, call_type=None):
+        i = self.slot[ambulance_id]
+        self.status[i] = BUSY
+        self.target[i] = hospital
+        self.free_at[i] = free_at
+        self.patient_id[i] = patient_id
+        self.patient_node[i] = patient_node
+        self.call_type[i] = call_type
+        self.call_time[i] = call_time
+        self.assignment_time[i] = assignment_time
+
+    def release(self, ambulance_id, node, station, time):
+        # Ambulance reached the hospital `node`; it is available again and heads back to `station`
+        i = self.slot[ambulance_id]
+        self.status[i] = AVAILABLE
+        self.node[i] = node
+        self.base[i] = node
+        self.target[i] = station
+        self.free_at[i] = np.inf
+        self.leg_start[i] = time
+        self.patient_id[i] = None
+        self.patient_node[i] = NO_NODE
+        self.available_seq[i] = self.seq
+        self.seq += 1
+        self.clear_route(ambulance_id)
+
+    def abort(self, ambulance_id, time):
+        # Trip given up before reaching the patient; the ambulance is available where it stands
+        i = self.slot[ambulance_id]
+        self.status[i] = AVAILABLE
+        self.target[i] = self.node[i]
+        self.free_at[i] = np.inf
+        self.leg_start[i] = time
+        self.patient_id[i] = None
+        self.patient_node[i] = NO_NODE
+        self.available_seq[i] = self.seq
+        self.seq += 1
+        self.clear_route(ambulance_id)
+
+    def sync_position(self, ambulance_id, time):
+        # O(log n): bisect the route's cumulative arrival times for the last node reached by `time`
+        i = self.slot[ambulance_id]
+        if self.cursor[i] < 0:
+            return int(self.node[i])
+        start, end = self.route_start[i], self.route_end[i]
+        cursor = int(self.route_arrival[start:end].searchsorted(time, side='right')) - 1
+        if cursor > self.cursor[i]:
+            self.cursor[i] = cursor
+            self.node[i] = self.route_nodes[start + cursor]
+            self.leg_start[i] = self.route_arrival[start + cursor]
+        return int(self.node[i])
+
+    def sync_positions(self, slots, time):
+        for i in slots:
+            self.sync_position(self.ids[i], time)
+
+    def advance_to(self, time):
+        # Vectorized: move every ambulance with a route to the last route node reached by `time`
+        moving = np.flatnonzero(self.cursor >= 0)
+        if not len(moving):
+            return
+        reached = np.concatenate([[0], np.cumsum(self.route_arrival[:self.pool_used] <= time)])
+        starts, ends = self.route_start[moving], self.route_end[moving]
+        counts = reached[ends] - reached[starts]
+        cursor = np.maximum(counts - 1, self.cursor[moving])
+        changed = cursor != self.cursor[moving]
+        slots = moving[changed]
+        self.cursor[slots] = cursor[changed]
+        self.node[slots] = self.route_nodes[starts[changed] + cursor[changed]]
+        self.leg_start[slots] = self.route_arrival[starts[changed] + cursor[changed]]
+
+    def reserve(self, length):
+        if self.pool_used + length <= len(self.route_nodes):
+            return
+        self.compact()
+        if self.pool_used + length > len(self.route_nodes):
+            size = max(2 * len(self.route_nodes), self.pool_used + length)
+            self.route_nodes = np.resize(self.route_nodes, size)
+            self.route_arrival = np.resize(self.route_arrival, size)
+            self.route_leg = np.resize(self.route_leg, size)
+
+    def compact(self):
+        # Drop finished routes from the pool, keeping live ones contiguous from the start
+        offset = 0
+        live = np.flatnonzero(self.cursor >= 0)
+        for i in live[np.argsort(self.route_start[live])]:
+            start, end = self.route_start[i], self.route_end[i]
+            length = end - start
+            self.route_nodes[offset:offset + length] = self.route_nodes[start:end]
+            self.route_arrival[offset:offset + length] = self.route_arrival[start:end]
+            self.route_leg[offset:offset + length] = self.route_leg[start:end]
+            self.route_start[i], self.route_end[i] = offset, offset + length
+            offset += length
+        self.pool_used = offset
@@ -0,0 +1,185 @@
+import argparse
+import os
+import shutil
+import subprocess
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from movement_log import MovementLog, load_movement_log
+
+# Headless rendering of the road graph and of ambulance replays. Figures are drawn on an Agg
+# canvas without pyplot, so no GUI backend or display is needed. All edges are one LineCollection
+# and each node type one scatter, so the draw cost does not grow with per-node Python objects.
+# Replays draw the graph once, keep the rendered pixels and, for every frame, restore them and
+# draw only the ambulance markers and the clock on top.
+NODE_STYLES = {'E': ('blue', 12, 'emergency'), 'H': ('green', 40, 'hospital'), 'A': ('red', 60, 'station')}
+LABEL_LIMIT = 300  # graphs with more nodes are drawn without node names
+AVAILABLE_COLOR, BUSY_COLOR = 'black', 'orange'
+
+
+def graph_arrays(graph):
+    # (names, types, coords, edges) of a CSRGraph or of a networkx graph with 'pos' and 'node_type'
+    if hasattr(graph, 'coords'):
+        return ([str(name) for name in graph.names], np.asarray(graph.types).astype(str), np.asarray(graph.coords, dtype=float),
+                np.column_stack([graph.edge_u, graph.edge_v]))
+    names = list(graph.nodes)
+    index = {name: i for i, name in enumerate(names)}
+    types = np.array([data.get('node_type', name[0]) for name, data in graph.nodes(data=True)])
+    coords = np.array([graph.nodes[name]['pos'] for name in names], dtype=float)
+    edges = np.array([(index[u], index[v]) for u, v in graph.edges()], dtype=np.int64).reshape(-1, 2)
+    return names, types, coords, edges
+
+
+def new_figure(size=12, dpi=100):
+    figure = Figure(figsize=(size, size), dpi=dpi)
+    FigureCanvasAgg(figure)
+    return figure, figure.add_subplot()
+
+
+def draw_graph(ax, graph, labels=None):
+    names, types, coords, edges = graph_arrays(graph)
+    ax.add_collection(LineCollection(coords[edges], colors='0.65', linewidths=0.6, zorder=1))
+    for node_type, (color, size, label) in NODE_STYLES.items():
+        mask = types == node_type
+        if mask.any():
+            ax.scatter(coords[mask, 0], coords[mask, 1], s=size, c=color, label=label, linewidths=0, zorder=2)
+    if labels is None:
+        labels = len(names) <= LABEL_LIMIT
+    if labels:
+        for name, (x, y) in zip(names, coords.tolist()):
+            ax.annotate(name, (x, y), fontsize=6, xytext=(2, 2), textcoords='offset points', zorder=3)
+    ax.autoscale_view()
+    ax.set_aspect('equal')
+    ax.legend(loc='best')
+    return dict(zip(names, coords))
+
+
+def render_graph(graph, file_path, title='Visualized Graph from Text File', labels=None, size=12, dpi=100):
+    # The format follows the file extension (png, svg, pdf, ...)
+    figure, ax = new_figure(size, dpi)
+    draw_graph(ax, graph, labels)
+    ax.set_title(title)
+    figure.savefig(file_path)
+    return file_path
+
+
+class FrameSink:
+    # Where replay frames go, by file extension: .gif is assembled by Pillow, a video extension is
+    # piped to ffmpeg as raw RGBA, and a path without extension becomes a directory of PNG frames.
+    # Only GIF keeps frames in memory, so long replays belong in a video or a frame directory.
+    def __init__(self, file_path, width, height, fps):
+        self.file_path, self.fps = file_path, fps
+        self.kind = os.path.splitext(file_path)[1].lower() or 'frames'
+        self.frames, self.count, self.process = [], 0, None
+        if self.kind == 'frames':
+            os.makedirs(file_path, exist_ok=True)
+        elif self.kind != '.gif':
+            if shutil.which('ffmpeg') is None:
+                raise RuntimeError(f"writing {self.kind} needs ffmpeg; use .gif or a frame directory instead")
+            self.process = subprocess.Popen(
+                ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', f"{width}x{height}",
+                 '-r', str(fps), '-i', '-', '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', file_path],
+                stdin=subprocess.PIPE)
+
+    def write(self, rgba):
+        from PIL import Image
+        if self.process is not None:
+            self.process.stdin.write(rgba.tobytes())
+        elif self.kind == '.gif':
+            self.frames.append(Image.fromarray(rgba).convert('RGB').quantize(64))
+        else:
+            Image.fromarray(rgba).save(os.path.join(self.file_path, f"frame{self.count:06d}.png"))
+        self.count += 1
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            if self.process.wait():
+                raise RuntimeError(f"ffmpeg failed writing {self.file_path}")
+        elif self.frames:
+            self.frames[0].save(self.file_path, save_all=True, append_images=self.frames[1:],
+                                duration=max(1, round(1000 / self.fps)), loop=0)
+            self.frames = []
+
+
+def render_replay(graph, log, file_path, start=None, end=None, step=1.0, fps=20, labels=False, size=8, dpi=100,
+                  title='Ambulance replay'):
+    # One frame every `step` simulated minutes from start to end (default: the whole log).
+    # Returns the number of frames written.
+    first, last = log.time_range()
+    start = first if start is None else start
+    end = last if end is None else end
+    times = np.arange(start, end + step / 2, step)
+
+    figure, ax = new_figure(size, dpi)
+    positions_by_name = draw_graph(ax, graph, labels)
+    ax.set_title(title)
+    coords = np.array([positions_by_name[name] for name in log.nodes])
+    # Markers and clock are left out of the background draw and drawn over it on each frame
+    markers = ax.scatter([], [], s=70, marker='s', edgecolors='white', linewidths=0.8, zorder=4, animated=True)
+    clock = ax.text(0.01, 0.99, '', transform=ax.transAxes, va='top', fontsize=10, zorder=5, animated=True)
+    canvas = figure.canvas
+    canvas.draw()
+    background = canvas.copy_from_bbox(figure.bbox)
+    width, height = canvas.get_width_height()
+    colors = np.array([AVAILABLE_COLOR, BUSY_COLOR])
+
+    sink = FrameSink(file_path, width, height, fps)
+    try:
+        # Positions are computed a block of frames at a time, so memory stays flat for long replays
+        for block in range(0, len(times), 1024):
+            block_times = times[block:block + 1024]
+            positions, busy = log.positions(block_times, coords), log.busy(block_times)
+            for time, frame_positions, frame_busy in zip(block_times, positions, busy):
+                canvas.restore_region(background)
+                markers.set_offsets(frame_positions)
+                markers.set_facecolors(colors[frame_busy.astype(int)])
+                clock.set_text(f"t = {time:.1f} min, {int(frame_busy.sum())}/{len(frame_busy)} busy")
+                ax.draw_artist(markers)
+                ax.draw_artist(clock)
+                sink.write(np.asarray(canvas.buffer_rgba()))
+    finally:
+        sink.close()
+    return len(times)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render the road graph and ambulance replays without a display")
+    parser.add_argument('--graph', default='graph_structure.txt')
+    parser.add_argument('--out', default='graph.png', help="graph image; the extension picks the format (png, svg, ...)")
+    parser.add_argument('--replay', default=None, help="also write a replay: .gif, a video extension (needs ffmpeg) or a frame directory")
+    parser.add_argument('--movements', default=None, help="movement log saved by MovementLog.save; without it a run is simulated")
+    parser.add_argument('--save-movements', default=None, help="keep the simulated run's movement log in this file")
+    parser.add_argument('--policy', default='returning')
+    parser.add_argument('--calls', type=int, default=100)
+    parser.add_argument('--interarrival', type=float, default=20.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--step', type=float, default=1.0, help="simulated minutes per frame")
+    parser.add_argument('--fps', type=int, default=20)
+    args = parser.parse_args()
+
+    from artifact_store import open_store
+    store = open_store(args.graph)
+    render_graph(store.graph(), args.out)
+    print(f"Graph written to {args.out}")
+
+    if args.replay:
+        if args.movements:
+            log = load_movement_log(args.movements)
+        else:
+            from call_source import poisson_calls
+            from dispatch_engine import AmbulanceDispatch, POLICIES
+            names = store.node_names()
+            stations = [node for node in names if node.startswith('A')]
+            dispatcher = AmbulanceDispatch(store.graph().to_networkx(), {i + 1: (station, None, station, None, None) for i, station in enumerate(stations)},
+                                           store.travel_times(), policy=POLICIES[args.policy], assignments=store.hospital_assignments(),
+                                           hospital_to_station=store.station_mapping())
+            log = MovementLog().attach(dispatcher)
+            dispatcher.run_simulation(poisson_calls(1 / args.interarrival, [node for node in names if node.startswith('E')],
+                                                    seed=args.seed, max_calls=args.calls))
+            log.detach()
+            if args.save_movements:
+                log.save(args.save_movements)
+        frames = render_replay(store.graph(), log, args.replay, step=args.step, fps=args.fps)
+        print(f"Replay of {frames} frames written to {args.replay}")
@@ -0,0 +1,28 @@
+import numpy as np
+from facility_index import FacilityIndex
+
+# Nearest hospital of every emergency (E) node by network travel time. artifact_store.py keeps the
+# result per graph file, so it is computed once rather than per run.
+NO_HOSPITAL = -1
+
+
+def build_hospital_assignments(graph):
+    # One multi-source Dijkstra from all hospitals -> (emergency nodes, hospitals, hospital index, travel time)
+    emergency_nodes = [node for node in graph.nodes if node.startswith('E')]
+    hospitals = [node for node in graph.nodes if node.startswith('H')]
+    index = FacilityIndex.build(graph, hospitals)
+    hospital_rank = {hospital: i for i, hospital in enumerate(hospitals)}
+    hospital = np.full(len(emergency_nodes), NO_HOSPITAL, dtype=np.int32)
+    travel_time = np.full(len(emergency_nodes), np.inf)
+    for i, node in enumerate(emergency_nodes):
+        if node in index:
+            nearest, travel_time[i] = index.nearest(node)
+            hospital[i] = hospital_rank[nearest]
+    return emergency_nodes, hospitals, hospital, travel_time
+
+
+def hospital_assignment_mapping(graph):
+    # {emergency node: nearest hospital} as the dispatcher uses it, unreachable nodes left out;
+    # artifact_store.py keeps it per graph file
+    emergency_nodes, hospitals, hospital, _ = build_hospital_assignments(graph)
+    return {node: hospitals[h] for node, h in zip(emergency_nodes, hospital.tolist()) if h != NO_HOSPITAL}
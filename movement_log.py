@@ -0,0 +1,120 @@
+import networkx as nx
+import numpy as np
+from array_file import save_arrays, load_arrays
+from fleet_state import NO_NODE
+
+# Where every ambulance was during a run, for replays (see graph_render.py). Trip records only
+# carry times, so attach(dispatcher) wraps the fleet's set_route, dispatch and release on that
+# instance: a tracked route adds its nodes at their arrival times, a trip without one adds the
+# patient at the ambulance to patient travel time and the hospital at the delivery time. A new
+# route drops the keyframes after its start, which it replaced. Between keyframes an ambulance
+# moves in a straight line.
+HOOKS = ('set_route', 'dispatch', 'release')
+
+
+class MovementLog:
+    def __init__(self, nodes=(), ids=()):
+        self.nodes = list(nodes)  # node names; keyframe nodes are ids into this list
+        self.ids = list(ids)
+        self.keyframes = {ambulance_id: ([], []) for ambulance_id in self.ids}  # ambulance_id -> ([time], [node id])
+        self.trips = []  # [ambulance_id, dispatch time, delivery time (inf while under way)]
+        self.fleet = None
+
+    def attach(self, dispatcher):
+        fleet = self.fleet = dispatcher.fleet
+        self.nodes, self.ids = list(fleet.nodes), list(fleet.ids)
+        for i, ambulance_id in enumerate(self.ids):
+            self.keyframes.setdefault(ambulance_id, ([], []))
+            self.record(ambulance_id, [float(dispatcher.current_time)], [int(fleet.node[i])])
+        set_route, dispatch, release = fleet.set_route, fleet.dispatch, fleet.release
+        open_trips = {}
+
+        def record_route(ambulance_id, route, edge_times, start_time):
+            set_route(ambulance_id, route, edge_times, start_time)
+            i = fleet.slot[ambulance_id]
+            start, end = fleet.route_start[i], fleet.route_end[i]
+            self.record(ambulance_id, fleet.route_arrival[start:end].tolist(), fleet.route_nodes[start:end].tolist())
+
+        def record_dispatch(ambulance_id, hospital, free_at, *args):
+            dispatch(ambulance_id, hospital, free_at, *args)
+            now = float(dispatcher.current_time)
+            i = fleet.slot[ambulance_id]
+            times, nodes = [now], [int(fleet.node[i])]
+            if fleet.patient_node[i] != NO_NODE:
+                try:
+                    to_patient = dispatcher.travel_times.distance(fleet.nodes[fleet.node[i]], fleet.nodes[fleet.patient_node[i]])
+                    times.append(min(now + to_patient, float(free_at)))
+                    nodes.append(int(fleet.patient_node[i]))
+                except nx.NetworkXNoPath:
+                    pass
+            self.record(ambulance_id, times + [float(free_at)], nodes + [int(hospital)])
+            open_trips[ambulance_id] = len(self.trips)
+            self.trips.append([ambulance_id, now, np.inf])
+
+        def record_release(ambulance_id, node, station, time):
+            release(ambulance_id, node, station, time)
+            self.record(ambulance_id, [float(time)], [int(node)])
+            if ambulance_id in open_trips:
+                self.trips[open_trips.pop(ambulance_id)][2] = float(time)
+
+        fleet.set_route, fleet.dispatch, fleet.release = record_route, record_dispatch, record_release
+        return self
+
+    def detach(self):
+        if self.fleet is not None:
+            for name in HOOKS:
+                self.fleet.__dict__.pop(name, None)
+            self.fleet = None
+
+    def record(self, ambulance_id, times, nodes):
+        keyframe_times, keyframe_nodes = self.keyframes[ambulance_id]
+        keep = int(np.searchsorted(keyframe_times, times[0], side='left'))
+        del keyframe_times[keep:], keyframe_nodes[keep:]
+        keyframe_times.extend(times)
+        keyframe_nodes.extend(nodes)
+
+    def positions(self, times, coords):
+        # (len(times), n_ambulances, 2) positions; coords[i] is the position of node id i
+        times = np.asarray(times, dtype=float)
+        positions = np.empty((len(times), len(self.ids), 2))
+        for j, ambulance_id in enumerate(self.ids):
+            keyframe_times, keyframe_nodes = self.keyframes[ambulance_id]
+            points = coords[keyframe_nodes]
+            positions[:, j, 0] = np.interp(times, keyframe_times, points[:, 0])
+            positions[:, j, 1] = np.interp(times, keyframe_times, points[:, 1])
+        return positions
+
+    def busy(self, times):
+        # (len(times), n_ambulances) True while an ambulance carries a patient
+        times = np.asarray(times, dtype=float)
+        slot = {ambulance_id: j for j, ambulance_id in enumerate(self.ids)}
+        busy = np.zeros((len(times), len(self.ids)), dtype=bool)
+        for ambulance_id, start, end in self.trips:
+            busy[np.searchsorted(times, start, side='left'):np.searchsorted(times, end, side='left'), slot[ambulance_id]] = True
+        return busy
+
+    def time_range(self):
+        times = [time for keyframe_times, _ in self.keyframes.values() for time in keyframe_times if np.isfinite(time)]
+        return (min(times), max(times)) if times else (0.0, 0.0)
+
+    def save(self, file_path):
+        counts = [len(self.keyframes[ambulance_id][0]) for ambulance_id in self.ids]
+        trips = np.array(self.trips, dtype=float).reshape(-1, 3)
+        save_arrays(file_path, {
+            'keyframe_indptr': np.cumsum([0] + counts, dtype=np.int64),
+            'keyframe_time': np.array([time for ambulance_id in self.ids for time in self.keyframes[ambulance_id][0]], dtype=float),
+            'keyframe_node': np.array([node for ambulance_id in self.ids for node in self.keyframes[ambulance_id][1]], dtype=np.int32),
+            'trip_slot': np.array([self.ids.index(ambulance_id) for ambulance_id, _, _ in self.trips], dtype=np.int32),
+            'trip_times': trips[:, 1:],
+        }, {'nodes': self.nodes, 'ids': self.ids})
+
+
+def load_movement_log(file_path):
+    meta, arrays = load_arrays(file_path, mmap=False)
+    log = MovementLog(meta['nodes'], meta['ids'])
+    indptr = arrays['keyframe_indptr'].tolist()
+    times, nodes = arrays['keyframe_time'].tolist(), arrays['keyframe_node'].tolist()
+    for j, ambulance_id in enumerate(log.ids):
+        log.keyframes[ambulance_id] = (times[indptr[j]:indptr[j + 1]], nodes[indptr[j]:indptr[j + 1]])
+    log.trips = [[log.ids[slot], start, end] for slot, (start, end) in zip(arrays['trip_slot'].tolist(), arrays['trip_times'].tolist())]
+    return log
@@ -0,0 +1,147 @@
+import json
+import time
+from collections import Counter
+
+# Opt-in hot-path instrumentation for AmbulanceDispatch. Profiler().attach(dispatcher) replaces
+# the dispatcher's phase methods, and the query methods of the routing objects it reads, with
+# timed wrappers on those instances; detach() puts the originals back. Routing objects are shared
+# between dispatchers, so detach before timing an unprofiled run on them.
+
+PHASES = (
+    'run_simulation', 'step', 'process_calls_and_queue', 'dispatch_ambulance', 'find_nearby_ambulances',
+    'select_best_ambulance', 'mark_ambulance_unavailable', 'update_available_ambulances',
+    'process_queued_requests', 'dispatch_batch', 'apply_road_updates',
+)
+ROUTING_QUERIES = ('distance', 'path', 'distances_from')  # wrapped where the routing object has them
+
+
+class Profiler:
+    def __init__(self):
+        self.calls = Counter()
+        self.total_ns = Counter()   # inclusive time per phase
+        self.self_ns = Counter()    # time not spent in nested phases
+        self.counts = Counter()     # reported by the dispatcher itself, see count()
+        self.queue_depth = Counter()         # waiting calls, sampled once per loop iteration
+        self.event_depth_log2 = Counter()    # pending events, in power-of-two buckets
+        self.stack = []
+        self.dispatcher = None
+        self.wrapped = []         # (object, attribute, original or None if it came from the class)
+        self.instrumented = set() # ids of routing objects already wrapped by this profiler
+        self.cache_sources = {}   # name -> (object keeping hits/misses, hits, misses at attach)
+
+    def timed(self, name, function):
+        clock, stack = time.perf_counter_ns, self.stack
+        calls, total_ns, self_ns = self.calls, self.total_ns, self.self_ns
+
+        def wrapper(*args, **kwargs):
+            stack.append(0)
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = clock() - start
+                nested = stack.pop()
+                calls[name] += 1
+                total_ns[name] += elapsed
+                self_ns[name] += elapsed - nested
+                if stack:
+                    stack[-1] += elapsed
+        return wrapper
+
+    def wrap(self, obj, name, wrapper):
+        self.wrapped.append((obj, name, obj.__dict__.get(name)))
+        setattr(obj, name, wrapper)
+
+    def attach(self, dispatcher):
+        self.dispatcher = dispatcher
+        dispatcher.profiler = self
+        for name in PHASES:
+            if hasattr(dispatcher, name):
+                self.wrap(dispatcher, name, self.timed(name, getattr(dispatcher, name)))
+        process_queued_requests = dispatcher.process_queued_requests
+
+        def sample_queues():
+            self.queue_depth[len(dispatcher.priority_queue)] += 1
+            self.event_depth_log2[len(dispatcher.events).bit_length()] += 1
+            return process_queued_requests()
+        self.wrap(dispatcher, 'process_queued_requests', sample_queues)
+        writer = dispatcher.results_writer
+        self.wrap(writer, 'write_chunk', self.timed('results_write', writer.write_chunk))
+        self.instrument_routing(dispatcher.travel_times)
+        # Cache statistics kept by the routing backends themselves, counted from now on
+        for prefix, source in (('router', dispatcher.travel_times), ('traffic', dispatcher.traffic)):
+            if source is not None and hasattr(source, 'hits'):
+                self.cache_sources[prefix] = (source, source.hits, source.misses)
+        if dispatcher.traffic is not None:
+            # Time-of-day tables are swapped in while the run goes on, instrument each one as it is built
+            table = dispatcher.traffic.table
+
+            def instrumented_table(bucket):
+                return self.instrument_routing(table(bucket))
+            self.wrap(dispatcher.traffic, 'table', self.timed('traffic_table', instrumented_table))
+        return self
+
+    def detach(self):
+        # Restores every wrapped method, last wrapped first
+        for obj, name, original in reversed(self.wrapped):
+            if original is None:
+                delattr(obj, name)
+            else:
+                setattr(obj, name, original)
+        self.wrapped = []
+        self.instrumented = set()
+        if self.dispatcher is not None and self.dispatcher.profiler is self:
+            self.dispatcher.profiler = None
+        return self
+
+    def count(self, name, n=1):
+        # Called by the dispatcher where no method can be wrapped: 'distance_reads' are the travel
+        # times read straight from a dist table (candidate search, prefilter probe, batch cost
+        # matrix, station repair), 'nearest_searches' the bounded candidate searches on the graph
+        self.counts[name] += n
+
+    def instrument_routing(self, travel_times):
+        if id(travel_times) not in self.instrumented:
+            for name in ROUTING_QUERIES:
+                if not hasattr(travel_times, name):
+                    continue
+                self.wrap(travel_times, name, self.timed('routing.' + name, getattr(travel_times, name)))
+            self.instrumented.add(id(travel_times))
+        return travel_times
+
+    def counters(self):
+        counters = {'routing_queries': sum(self.calls['routing.' + name] for name in ROUTING_QUERIES)}
+        counters.update(distance_reads=self.counts['distance_reads'], nearest_searches=self.counts['nearest_searches'])
+        for prefix, (source, hits, misses) in self.cache_sources.items():
+            counters[prefix + '_cache_hits'] = source.hits - hits
+            counters[prefix + '_cache_misses'] = source.misses - misses
+        return counters
+
+    def report(self):
+        return {
+            'phases': {
+                name: {
+                    'calls': self.calls[name],
+                    'total_s': self.total_ns[name] / 1e9,
+                    'self_s': self.self_ns[name] / 1e9,
+                    'mean_us': self.total_ns[name] / self.calls[name] / 1e3,
+                }
+                for name in sorted(self.calls, key=self.self_ns.get, reverse=True)
+            },
+            'counters': self.counters(),
+            'queue_depth': {str(depth): count for depth, count in sorted(self.queue_depth.items())},
+            'event_queue_depth_log2': {f"<{1 << bucket}": count for bucket, count in sorted(self.event_depth_log2.items())},
+        }
+
+    def summary(self):
+        report = self.report()
+        lines = [f"{'phase':<30}{'calls':>10}{'total s':>12}{'self s':>12}{'mean us':>12}"]
+        for name, phase in report['phases'].items():
+            lines.append(f"{name:<30}{phase['calls']:>10}{phase['total_s']:>12.4f}{phase['self_s']:>12.4f}{phase['mean_us']:>12.1f}")
+        lines.append("counters: " + ", ".join(f"{name} {value}" for name, value in report['counters'].items()))
+        lines.append("queue depth: " + ", ".join(f"{depth}:{count}" for depth, count in report['queue_depth'].items()))
+        return "\n".join(lines)
+
+    def write_json(self, file_path):
+        with open(file_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
@@ -0,0 +1,172 @@
+import argparse
+import json
+import math
+import os
+from multiprocessing import Pool
+import numpy as np
+from results_writer import MemoryResultsWriter
+from event_log import EventLog
+from call_source import poisson_calls
+from traffic import load_traffic
+from artifact_store import open_store
+from dispatch_engine import POLICIES, PolicyComparison
+
+HISTOGRAM_BIN = 1.0      # response-time histogram resolution
+HISTOGRAM_BINS = 20000   # response times beyond the last bin are counted in it
+PERCENTILES = (50, 90, 95, 99)
+
+# Read-only data loaded once per worker process. The graph and routing tables are memory-mapped
+# from the graph file's artifact store, so every worker shares the same pages.
+worker_data = {}
+
+
+def load_routing(store, routing):
+    # 'matrix' is the all-pairs travel time table, 'alt' A* queries with landmarks for large graphs
+    if routing == 'alt':
+        return store.router()
+    return store.travel_times()
+
+
+def prepare_shared_data(graph_file, routing='matrix'):
+    # Build the artifacts in the parent so workers only ever read them
+    store = open_store(graph_file)
+    load_routing(store, routing)
+    store.hospital_assignments()
+    store.station_mapping()
+
+
+def init_worker(graph_file, stations, routing='matrix'):
+    store = open_store(graph_file)
+    csr_graph = store.graph()
+    travel_times = load_routing(store, routing)
+    graph = csr_graph.to_networkx()
+    nodes = travel_times.nodes
+    emergency_nodes = [node for node in nodes if node.startswith('E')]
+    worker_data.update(
+        graph=graph,
+        travel_times=travel_times,
+        emergency_nodes=emergency_nodes,
+        assignments=store.hospital_assignments(),
+        hospital_to_station=store.station_mapping(),
+        traffic=load_traffic(csr_graph, graph_file),  # per-bucket tables are reused across replications
+        stations=stations or [node for node in nodes if node.startswith('A')],
+    )
+
+
+def generate_scenario(seed, n_calls, mean_interarrival, emergency_nodes):
+    # Poisson arrivals at uniformly chosen emergency nodes, streamed lazily into the simulator
+    return poisson_calls(1.0 / mean_interarrival, emergency_nodes, seed=seed, max_calls=n_calls)
+
+
+def summarize(records, n_calls):
+    response = np.array([record.hospital_arrival - record.call_time for record in records], dtype=float)
+    wait = np.array([record.assignment_time - record.call_time for record in records], dtype=float)
+    bins = np.minimum((response // HISTOGRAM_BIN).astype(int), HISTOGRAM_BINS - 1)
+    return {
+        'calls': n_calls,
+        'served': len(records),
+        'mean_response': float(response.mean()) if len(response) else math.nan,
+        'mean_wait': float(wait.mean()) if len(wait) else math.nan,
+        'histogram': np.bincount(bins, minlength=HISTOGRAM_BINS).astype(np.int32),
+    }
+
+
+def run_replication(task):
+    seed, n_calls, mean_interarrival, policies, batch_window = task
+    # Every policy runs over the same call stream, generated once, in a single pass
+    patient_calls = generate_scenario(seed, n_calls, mean_interarrival, worker_data['emergency_nodes'])
+    ambulance_data = {i + 1: (station, None, station, None, None) for i, station in enumerate(worker_data['stations'])}
+    comparison = PolicyComparison(worker_data['graph'], ambulance_data, {policy: POLICIES[policy] for policy in policies},
+                                  worker_data['travel_times'], worker_data['assignments'], worker_data['hospital_to_station'],
+                                  {policy: MemoryResultsWriter() for policy in policies}, EventLog())
+    comparison.traffic = worker_data['traffic']
+    for dispatcher in comparison.dispatchers.values():
+        dispatcher.batch_window = batch_window
+    dispatchers = comparison.run(patient_calls)
+    return seed, {policy: summarize(dispatcher.results_writer.records, n_calls) for policy, dispatcher in dispatchers.items()}
+
+
+def histogram_percentile(histogram, q):
+    cumulative = np.cumsum(histogram)
+    if not cumulative[-1]:
+        return None
+    return float((np.searchsorted(cumulative, q / 100 * cumulative[-1]) + 1) * HISTOGRAM_BIN)
+
+
+def merge_summaries(results):
+    # results: iterable of (seed, {policy: summary}) -> per-policy statistics across replications
+    merged = {}
+    for _, summaries in results:
+        for policy, summary in summaries.items():
+            entry = merged.setdefault(policy, {'means': [], 'waits': [], 'calls': 0, 'served': 0, 'histogram': np.zeros(HISTOGRAM_BINS, dtype=np.int64)})
+            entry['means'].append(summary['mean_response'])
+            entry['waits'].append(summary['mean_wait'])
+            entry['calls'] += summary['calls']
+            entry['served'] += summary['served']
+            entry['histogram'] += summary['histogram']
+
+    # Statistics that need more replications with finished trips than there were are None (null in JSON)
+    report = {}
+    for policy, entry in merged.items():
+        means = np.array(entry['means'])
+        means = means[~np.isnan(means)]
+        n = len(means)
+        mean = float(means.mean()) if n else None
+        if n > 1:
+            half_width = 1.96 * means.std(ddof=1) / math.sqrt(n)
+            ci95 = [mean - half_width, mean + half_width]
+        else:
+            ci95 = None
+        report[policy] = {
+            'replications': len(entry['means']),
+            'calls': entry['calls'],
+            'served': entry['served'],
+            'mean_response': mean,
+            'ci95': ci95,
+            'mean_wait': float(np.nanmean(entry['waits'])) if n else None,
+            'percentiles': {f"p{q}": histogram_percentile(entry['histogram'], q) for q in PERCENTILES},
+        }
+    return report
+
+
+def report_line(policy, stats):
+    def number(value, digits=2):
+        return "n/a" if value is None else f"{value:.{digits}f}"
+    ci = f" (95% CI {stats['ci95'][0]:.2f}-{stats['ci95'][1]:.2f})" if stats['ci95'] is not None else ""
+    return (f"{policy}: {stats['served']}/{stats['calls']} served over {stats['replications']} replications, "
+            f"mean response {number(stats['mean_response'])}{ci}, mean wait {number(stats['mean_wait'])}, "
+            + ", ".join(f"{name} {number(value, 0)}" for name, value in stats['percentiles'].items()))
+
+
+def run_replications(replications, n_calls=30, mean_interarrival=150.0, policies=tuple(POLICIES), base_seed=0,
+                     processes=None, graph_file='graph_structure.txt', stations=None, batch_window=None, routing='matrix'):
+    prepare_shared_data(graph_file, routing)
+    tasks = [(base_seed + i, n_calls, mean_interarrival, tuple(policies), batch_window) for i in range(replications)]
+    processes = processes or os.cpu_count()
+    chunksize = max(1, replications // (4 * processes))
+    with Pool(processes, initializer=init_worker, initargs=(graph_file, stations, routing)) as pool:
+        return merge_summaries(pool.imap_unordered(run_replication, tasks, chunksize=chunksize))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Monte Carlo comparison of ambulance return policies")
+    parser.add_argument('--replications', type=int, default=100)
+    parser.add_argument('--calls', type=int, default=30)
+    parser.add_argument('--interarrival', type=float, default=150.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--policies', nargs='+', default=list(POLICIES), choices=list(POLICIES))
+    parser.add_argument('--stations', nargs='+', default=None, help="one ambulance per listed station (default: every A node)")
+    parser.add_argument('--batch-window', type=float, default=None, help="assign waiting calls jointly after holding them this long (default: greedy dispatch)")
+    parser.add_argument('--routing', default='matrix', choices=['matrix', 'alt'], help="all-pairs table or A*/landmark queries")
+    parser.add_argument('--json', default=None, help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = run_replications(args.replications, args.calls, args.interarrival, args.policies, args.seed,
+                              args.processes, stations=args.stations, batch_window=args.batch_window,
+                              routing=args.routing)
+    for policy, stats in report.items():
+        print(report_line(policy, stats))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
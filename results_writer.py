@@ -0,0 +1,167 @@
+import csv
+import json
+import os
+from collections import namedtuple
+
+# One completed trip, written when the ambulance reaches the hospital
+TripRecord = namedtuple('TripRecord', ['patient_id', 'call_time', 'assignment_time', 'hospital_arrival', 'ambulance_id'])
+
+
+class ResultsWriter:
+    # Buffers records in memory and hands them to write_chunk in batches of chunk_size,
+    # so a run does one write per chunk instead of an open/append/close per trip
+    def __init__(self, file_path, chunk_size=4096, append=False):
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.append = append
+        self.buffer = []
+        self.records_written = 0
+
+    def write(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.write_chunk(self.buffer)
+            self.records_written += len(self.buffer)
+            self.buffer = []
+
+    def write_chunk(self, records):
+        raise NotImplementedError
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class MemoryResultsWriter(ResultsWriter):
+    # Keeps every record in `records`, for replications that summarise a run in-process
+    def __init__(self, chunk_size=4096):
+        super().__init__(None, chunk_size)
+        self.records = []
+
+    def write_chunk(self, records):
+        self.records.extend(records)
+
+
+class FileResultsWriter(ResultsWriter):
+    # Keeps one text handle open for the whole run
+    def __init__(self, file_path, chunk_size=4096, append=False, header=None):
+        super().__init__(file_path, chunk_size, append)
+        self.header = header
+        self.file = None
+
+    def open(self):
+        existed = self.append and os.path.exists(self.file_path) and os.path.getsize(self.file_path) > 0
+        self.file = open(self.file_path, 'a' if self.append else 'w', newline='')
+        if not existed:
+            self.write_header()
+
+    def write_header(self):
+        if self.header is not None:
+            self.file.write(self.header + '\n')
+
+    def write_chunk(self, records):
+        if self.file is None:
+            self.open()
+        self.file.write(''.join(self.format_record(record) for record in records))
+        self.file.flush()
+
+    def format_record(self, record):
+        raise NotImplementedError
+
+    def close(self):
+        if self.file is None and self.header is not None and not self.append:
+            self.open()  # Still produce the header for a run without completed trips
+        super().close()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class TextResultsWriter(FileResultsWriter):
+    # The original results_rp.txt / results_wrp.txt line format
+    def format_record(self, record):
+        return f"Patient {record.patient_id} called at time {record.call_time}, received an assignment at {record.assignment_time}, reached a hospital at {record.hospital_arrival}\n"
+
+
+class CSVResultsWriter(FileResultsWriter):
+    def write_header(self):
+        csv.writer(self.file).writerow(TripRecord._fields)
+
+    def write_chunk(self, records):
+        if self.file is None:
+            self.open()
+        csv.writer(self.file).writerows(records)
+        self.file.flush()
+
+
+class JSONLResultsWriter(FileResultsWriter):
+    def write_header(self):
+        pass
+
+    def format_record(self, record):
+        return json.dumps(record._asdict()) + '\n'
+
+
+class ArrowResultsWriter(ResultsWriter):
+    # Parquet (.parquet) or Arrow IPC (.arrow) output, only available when pyarrow is installed
+    def __init__(self, file_path, chunk_size=65536, file_format='parquet'):
+        super().__init__(file_path, chunk_size)
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError(f"pyarrow is required to write {file_format} results") from None
+        self.pa = pyarrow
+        self.file_format = file_format
+        self.writer = None
+        self.schema = None
+
+    def write_chunk(self, records):
+        pa = self.pa
+        columns = list(zip(*records))
+        if self.schema is None:
+            # Id columns keep whatever type the simulation uses, times are always float64
+            self.schema = pa.schema([
+                ('patient_id', pa.array(columns[0]).type),
+                ('call_time', pa.float64()),
+                ('assignment_time', pa.float64()),
+                ('hospital_arrival', pa.float64()),
+                ('ambulance_id', pa.array(columns[4]).type),
+            ])
+        table = pa.Table.from_arrays([pa.array(column, type=field.type) for column, field in zip(columns, self.schema)], schema=self.schema)
+        if self.writer is None:
+            if self.file_format == 'parquet':
+                import pyarrow.parquet as pq
+                self.writer = pq.ParquetWriter(self.file_path, self.schema)
+            else:
+                self.writer = pa.ipc.new_file(self.file_path, self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        super().close()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def open_results_writer(file_path, file_format=None, **kwargs):
+    # Picks the writer from file_format or the file extension (.txt, .csv, .jsonl, .parquet, .arrow)
+    if file_format is None:
+        file_format = os.path.splitext(file_path)[1].lstrip('.').lower() or 'txt'
+    if file_format == 'txt':
+        return TextResultsWriter(file_path, **kwargs)
+    if file_format == 'csv':
+        return CSVResultsWriter(file_path, **kwargs)
+    if file_format in ('jsonl', 'json'):
+        return JSONLResultsWriter(file_path, **kwargs)
+    if file_format in ('parquet', 'arrow', 'feather'):
+        return ArrowResultsWriter(file_path, file_format='parquet' if file_format == 'parquet' else 'arrow', **kwargs)
+    raise ValueError(f"Unknown results format: {file_format}")
@@ -0,0 +1,42 @@
+import heapq
+import itertools
+
+
+def k_nearest_ambulances(graph, patient_node, ambulances_at_node, k=None, radius=float('inf'), with_paths=False, weight=None):
+    # One Dijkstra growing outward from the patient (edges are undirected, so patient to ambulance
+    # equals ambulance to patient). Stops after k ambulances or once it passes the radius; if nothing
+    # lies inside the radius it keeps going until the nearest ambulance is found.
+    # ambulances_at_node maps node -> list of ambulance ids parked or driving there. weight(u, v, data)
+    # overrides the edge weights, e.g. with the traffic of the current time.
+    found = {}
+    dist = {patient_node: 0.0}
+    pred = {patient_node: None}
+    done = set()
+    counter = itertools.count()
+    heap = [(0.0, next(counter), patient_node)]
+    while heap:
+        d, _, node = heapq.heappop(heap)
+        if node in done:
+            continue
+        if d > radius and found:
+            break
+        done.add(node)
+        for ambulance_id in ambulances_at_node.get(node, ()):
+            if with_paths:
+                # Walk the predecessor chain back to the patient, giving the ambulance to patient path
+                path, step = [], node
+                while step is not None:
+                    path.append(step)
+                    step = pred[step]
+                found[ambulance_id] = (node, d, path)
+            else:
+                found[ambulance_id] = (node, d)
+            if d > radius or (k is not None and len(found) >= k):
+                return found
+        for neighbor, data in graph.adj[node].items():
+            nd = d + (data['weight'] if weight is None else weight(node, neighbor, data))
+            if nd < dist.get(neighbor, float('inf')):
+                dist[neighbor] = nd
+                pred[neighbor] = node
+                heapq.heappush(heap, (nd, next(counter), neighbor))
+    return found
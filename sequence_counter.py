@@ -0,0 +1,18 @@
+import itertools
+
+# Tie-breaking sequence numbers for the heap entries of the event and triage queues, which are
+# pickled with every snapshot (see snapshot.py).
+
+
+class SequenceCounter:
+    # Mixin for classes numbering their entries with next(self.counter). itertools.count does not
+    # pickle on every Python version, so the pickled state stores its next value instead.
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['counter'] = next(self.counter)
+        self.counter = itertools.count(state['counter'])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.counter = itertools.count(state['counter'])
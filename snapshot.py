@@ -0,0 +1,158 @@
+import copy
+import pickle
+import sys
+from collections import OrderedDict
+import numpy as np
+from array_file import save_arrays, load_arrays
+from fleet_state import FleetState
+from travel_times import TravelTimeMatrix
+from alt_routing import ALTRouter, PairDistances
+from traffic import TrafficTravelTimes
+from dispatch_engine import AmbulanceDispatch, retime_road
+
+# Snapshot and restore of a running AmbulanceDispatch, so a long horizon can be resumed after a
+# crash and many what-if branches can start from one warmed-up state. The fleet arrays are stored
+# raw in an array file (see array_file.py); everything else that changes during a run (event and
+# triage queues, trip versions, station paths, applied road changes, the call source with its RNG
+# state) is pickled into one byte array of the same file. The graph and routing tables are not
+# stored: restore takes them like the constructor does and replays the road changes on them.
+# Restoring unpickles the file, which can run arbitrary code: only load snapshots you wrote yourself
+# or got from a trusted source.
+SNAPSHOT_VERSION = 2
+
+FLEET_ARRAYS = ('status', 'node', 'target', 'base', 'cursor', 'leg_start', 'free_at', 'available_seq', 'patient_node',
+                'route_start', 'route_end')
+ROUTE_POOL = ('route_nodes', 'route_arrival', 'route_leg')
+FLEET_OBJECTS = ('patient_id', 'call_type', 'call_time', 'assignment_time')
+DISPATCHER_STATE = ('policy', 'current_time', 'last_call_time', 'candidate_limit', 'batch_window', 'batch_due',
+                    'was_queue_processed', 'priority_queue', 'parked', 'stranded', 'cancelled_calls', 'events', 'event_versions',
+                    'hospital_to_station', 'call_source', 'road_changes')
+
+
+def capture(dispatcher):
+    # (meta, arrays) of the dispatcher between two events. Pending results are flushed first, so
+    # records_written tells how many trips a resumed run has already reported.
+    dispatcher.results_writer.flush()
+    fleet = dispatcher.fleet
+    fleet.compact()
+    arrays = {name: np.array(getattr(fleet, name)) for name in FLEET_ARRAYS}
+    arrays.update({name: np.array(getattr(fleet, name)[:fleet.pool_used]) for name in ROUTE_POOL})
+    state = {name: getattr(dispatcher, name) for name in DISPATCHER_STATE}
+    state['fleet'] = {name: getattr(fleet, name).tolist() for name in FLEET_OBJECTS}
+    state['fleet'].update(ids=fleet.ids, seq=fleet.seq)
+    arrays['state'] = np.frombuffer(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL), dtype=np.uint8)
+    meta = {
+        'version': SNAPSHOT_VERSION,
+        'time': dispatcher.current_time,
+        'n_nodes': len(dispatcher.travel_times.nodes),
+        'records_written': dispatcher.results_writer.records_written,
+    }
+    return meta, arrays
+
+
+def restore(meta, arrays, graph, travel_times, results_writer=None, log=None, assignments=None, traffic=None):
+    # A new dispatcher continuing from a capture(); call its resume() to run on
+    if meta.get('version') != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot version {meta.get('version')}, expected {SNAPSHOT_VERSION}")
+    if meta['n_nodes'] != len(travel_times.nodes):
+        raise ValueError(f"snapshot of a {meta['n_nodes']}-node graph, travel times have {len(travel_times.nodes)} nodes")
+    state = pickle.loads(np.asarray(arrays['state']).tobytes())
+    # Bring the graph and routing tables to the roads of the snapshot; a graph that already has a
+    # change (a branch forked in the same process) is left alone
+    for u, v, weight in state['road_changes']:
+        if graph[u][v]['weight'] != weight:
+            retime_road(graph, travel_times, traffic, u, v, weight)
+
+    dispatcher = AmbulanceDispatch(graph, {}, travel_times, results_writer, log, state['policy'], assignments,
+                                   state['hospital_to_station'])
+    dispatcher.traffic = traffic
+    for name in DISPATCHER_STATE:
+        setattr(dispatcher, name, state[name])
+    if traffic is not None:
+        dispatcher.travel_times = traffic.for_time(dispatcher.current_time)
+
+    fleet_state = state['fleet']
+    fleet = FleetState(fleet_state['ids'], travel_times.nodes)
+    for name in FLEET_ARRAYS:
+        setattr(fleet, name, np.array(arrays[name]))
+    pool_used = len(arrays['route_nodes'])
+    for name in ROUTE_POOL:
+        pool = getattr(fleet, name)
+        if len(pool) < pool_used:
+            pool = np.resize(pool, pool_used)
+        pool[:pool_used] = arrays[name]
+        setattr(fleet, name, pool)
+    fleet.pool_used = pool_used
+    for name in FLEET_OBJECTS:
+        getattr(fleet, name)[:] = fleet_state[name]
+    fleet.seq = fleet_state['seq']
+    dispatcher.fleet = fleet
+    return dispatcher
+
+
+def save_snapshot(dispatcher, file_path):
+    meta, arrays = capture(dispatcher)
+    save_arrays(file_path, arrays, meta)
+    return meta
+
+
+def load_snapshot(file_path, graph, travel_times, results_writer=None, log=None, assignments=None, traffic=None):
+    meta, arrays = load_arrays(file_path, mmap=False)
+    return restore(meta, arrays, graph, travel_times, results_writer, log, assignments, traffic)
+
+
+def private_routing(routing):
+    # Copy of a routing object that a branch can re-time roads on without touching the original. The
+    # big tables are shared read-only views: TravelTimeMatrix.update_edge copies them on first write,
+    # ALTRouter only needs its own edge weights once it has re-timed a road, and each cached traffic
+    # table is a TravelTimeMatrix copy of its own.
+    branch = copy.copy(routing)
+    if isinstance(routing, TravelTimeMatrix):
+        branch.dist, branch.pred = routing.dist.view(), routing.pred.view()
+        branch.dist.flags.writeable = branch.pred.flags.writeable = False
+    elif isinstance(routing, ALTRouter):
+        if routing.weight_array is not None:
+            branch.weight_array = np.array(routing.weight_array)
+            branch.weights = list(routing.weights)
+        branch.cache = OrderedDict()
+        branch.dist = PairDistances(branch)
+    elif isinstance(routing, TrafficTravelTimes):
+        branch.tables = OrderedDict((bucket, private_routing(table)) for bucket, table in routing.tables.items())
+    else:
+        branch = copy.deepcopy(routing)
+    return branch
+
+
+def fork(dispatcher, n_branches, results_writers=None, log=None):
+    # Independent copies of a warmed-up dispatcher, each continuing with the same pending calls and
+    # RNG state. Every branch gets its own graph and copy-on-write routing data, so a road change in
+    # one branch never shows up in its siblings or the parent. Branches log to the parent's log unless given one.
+    meta, arrays = capture(dispatcher)
+    log = log if log is not None else dispatcher.log
+    traffic = dispatcher.traffic
+    branches = []
+    for i in range(n_branches):
+        results_writer = results_writers[i] if results_writers is not None else None
+        branches.append(restore(meta, arrays, dispatcher.graph.copy(), private_routing(dispatcher.travel_times), results_writer,
+                                log, dispatcher.assignments, private_routing(traffic) if traffic is not None else None))
+    return branches
+
+
+def run_with_snapshots(dispatcher, file_path, interval, patient_calls=None, time_step=1, horizon=None):
+    # Runs to the end, overwriting the snapshot at file_path every `interval` simulated time units.
+    # Pass patient_calls to start a run, leave it out to continue a restored one.
+    if patient_calls is not None:
+        dispatcher.start(patient_calls, time_step, horizon)
+    while dispatcher.next_event_time() is not None:
+        dispatcher.resume(until=dispatcher.next_event_time() + interval)
+        if dispatcher.next_event_time() is not None:
+            save_snapshot(dispatcher, file_path)
+
+
+if __name__ == "__main__":
+    # python snapshot.py <snapshot file>: what a snapshot holds
+    meta, arrays = load_arrays(sys.argv[1], mmap=False)
+    state = pickle.loads(np.asarray(arrays['state']).tobytes())
+    print(f"snapshot version {meta['version']} at time {meta['time']}, {meta['records_written']} trips reported, "
+          f"{len(arrays['status'])} ambulances, {len(state['events'])} pending events, "
+          f"{len(state['priority_queue']) + len(state['parked'])} waiting calls, {len(state['road_changes'])} road changes")
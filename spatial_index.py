@@ -0,0 +1,99 @@
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # scipy is optional, fall back to a uniform grid
+    cKDTree = None
+
+# Straight-line geometry of the road graph. SpatialIndex answers nearest-node queries on node
+# coordinates: calls that arrive as x/y positions are snapped to the nearest emergency node in
+# O(log n) with a KD-tree, or by scanning the grid cells around the point without scipy.
+# GraphGeometry adds the lower bound travel time >= ratio * straight-line distance that lets the
+# dispatcher skip routing queries for ambulances that cannot be the nearest.
+
+
+class GridIndex:
+    # Uniform grid with about `per_cell` points per cell; query() searches rings of cells outward
+    # until no unvisited cell can hold a closer point
+    def __init__(self, points, per_cell=4):
+        self.points = np.asarray(points, dtype=float)
+        self.low = self.points.min(axis=0)
+        extent = np.maximum(self.points.max(axis=0) - self.low, 1e-12)
+        n_cells = max(1, len(self.points) // per_cell)
+        self.cell = float(np.sqrt(extent[0] * extent[1] / n_cells)) or float(extent.max())
+        self.shape = np.floor(extent / self.cell).astype(int) + 1
+        self.cells = {}
+        for i, key in enumerate(map(tuple, self.cell_of(self.points).tolist())):
+            self.cells.setdefault(key, []).append(i)
+
+    def cell_of(self, points):
+        return np.clip(np.floor((points - self.low) / self.cell).astype(int), 0, self.shape - 1)
+
+    def query(self, point):
+        # (distance, index) of the nearest point
+        point = np.asarray(point, dtype=float)
+        cx, cy = self.cell_of(point[None])[0]
+        best, best_i = np.inf, -1
+        for ring in range(int(self.shape.max()) + 1):
+            # Every point in this ring or beyond lies at least (ring - 1) cells away
+            if best <= (ring - 1) * self.cell:
+                break
+            for x in range(cx - ring, cx + ring + 1):
+                for y in range(cy - ring, cy + ring + 1):
+                    if max(abs(x - cx), abs(y - cy)) != ring:
+                        continue
+                    for i in self.cells.get((x, y), ()):
+                        d = float(np.hypot(*(self.points[i] - point)))
+                        if d < best or (d == best and i < best_i):
+                            best, best_i = d, i
+        return best, best_i
+
+
+class SpatialIndex:
+    def __init__(self, names, coords):
+        self.names = list(names)
+        self.coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+        self.tree = cKDTree(self.coords) if cKDTree is not None else GridIndex(self.coords)
+
+    @classmethod
+    def from_graph(cls, graph, prefix='E'):
+        # Index of the nodes of one type of a networkx graph, by their 'pos' attribute
+        nodes = [node for node in graph.nodes if node.startswith(prefix)]
+        return cls(nodes, [graph.nodes[node]['pos'] for node in nodes])
+
+    def snap(self, x, y):
+        # (nearest node, straight-line distance to it)
+        distance, i = self.tree.query((float(x), float(y)))
+        return self.names[int(i)], float(distance)
+
+    def snap_many(self, points):
+        if cKDTree is not None:
+            distances, indices = self.tree.query(np.asarray(points, dtype=float).reshape(-1, 2))
+            return [self.names[i] for i in indices.tolist()], distances
+        snapped = [self.snap(x, y) for x, y in np.asarray(points, dtype=float).reshape(-1, 2)]
+        return [name for name, _ in snapped], np.array([distance for _, distance in snapped])
+
+
+class GraphGeometry:
+    # Coordinates of the nodes in routing-table order, the bound ratio and the call snapping index
+    def __init__(self, graph, nodes):
+        self.coords = np.array([graph.nodes[node]['pos'] for node in nodes], dtype=float)
+        self.index = {node: i for i, node in enumerate(nodes)}
+        self.ratio = np.inf
+        for u, v, data in graph.edges(data=True):
+            self.road_changed(u, v, data['weight'])
+        if not np.isfinite(self.ratio):
+            self.ratio = 0.0
+        self.calls = SpatialIndex.from_graph(graph)
+
+    def road_changed(self, u, v, weight):
+        # A faster road can lower the largest r with weight >= r * length over all edges; shaved
+        # slightly so rounding in path sums never makes the bound overestimate
+        length = float(np.hypot(*(self.coords[self.index[u]] - self.coords[self.index[v]])))
+        if length > 0:
+            self.ratio = min(self.ratio, max(0.0, weight / length * (1 - 1e-9)))
+
+    def lower_bounds(self, node_ids, target):
+        # Travel time lower bound from every node in node_ids (table indices) to node `target`
+        return self.ratio * np.hypot(*(self.coords[node_ids] - self.coords[self.index[target]]).T)
+
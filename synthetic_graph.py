@@ -0,0 +1,62 @@
+import numpy as np
+
+# Synthetic road networks in the graph_structure.txt format, for benchmarks at sizes the real
+# data does not reach. Nodes sit on a randomly filled, jittered grid and are always connected
+# (see generate_graph). Weights are straight-line length times a detour factor, so the Euclidean
+# bound of the A* router applies. Node types keep the proportions of graph_structure.txt
+# (200 E, 10 H, 7 A) and are numbered E first, then H, then A.
+
+HOSPITAL_FRACTION = 10 / 217
+STATION_FRACTION = 7 / 217
+
+
+def generate_graph(n_nodes, seed=0, spacing=10.0, edge_probability=0.6, detour=0.2):
+    # -> (names, types, coords, edge_u, edge_v, edge_w)
+    rng = np.random.default_rng(seed)
+    side = int(np.ceil(np.sqrt(n_nodes)))
+    cells = rng.permutation(side * side)[:n_nodes]
+    cells.sort()
+    row, col = cells // side, cells % side
+    coords = np.stack([col, row], axis=1) * spacing + rng.uniform(-0.3, 0.3, (n_nodes, 2)) * spacing
+
+    n_hospitals = max(1, round(n_nodes * HOSPITAL_FRACTION))
+    n_stations = max(1, round(n_nodes * STATION_FRACTION))
+    types = np.full(n_nodes, 'E')
+    special = rng.choice(n_nodes, n_hospitals + n_stations, replace=False)
+    types[special[:n_hospitals]] = 'H'
+    types[special[n_hospitals:]] = 'A'
+    # Renumber so that E nodes come first, then H, then A, like graph_structure.txt
+    order = np.concatenate([np.flatnonzero(types == t) for t in 'EHA'])
+    number = np.empty(n_nodes, dtype=np.int64)
+    number[order] = np.arange(n_nodes)
+    names = np.array([f"{t}{k}" for t, k in zip(types, number)])
+
+    # Each row is chained through its occupied cells, the first cells of consecutive rows are
+    # linked, and a cell is linked to the one straight below it with probability edge_probability
+    position = {cell: i for i, cell in enumerate(cells.tolist())}
+    row_first = np.flatnonzero(np.diff(np.concatenate([[-1], row])) != 0)
+    edges = set()
+    for i in range(n_nodes - 1):
+        if row[i + 1] == row[i]:
+            edges.add((i, i + 1))
+    edges.update(zip(row_first[:-1].tolist(), row_first[1:].tolist()))
+    for i, cell in enumerate(cells.tolist()):
+        down = position.get(cell + side)
+        if down is not None and rng.random() < edge_probability:
+            edges.add((i, down))
+    edge_u, edge_v = zip(*sorted(edges)) if edges else ((), ())
+    edge_u = np.asarray(edge_u, dtype=np.int32)
+    edge_v = np.asarray(edge_v, dtype=np.int32)
+    length = np.linalg.norm(coords[edge_u] - coords[edge_v], axis=1)
+    edge_w = np.round(length * (1 + rng.uniform(0, detour, len(length))), 2)
+    edge_w = np.maximum(edge_w, 0.01)
+    return names, types, coords, edge_u, edge_v, edge_w
+
+
+def write_graph_file(file_path, names, types, coords, edge_u, edge_v, edge_w):
+    # Same layout as graph_structure.txt: node count, "type number x y" per node, "u v weight" per edge
+    order = np.argsort([int(name[1:]) for name in names], kind='stable')
+    with open(file_path, 'w') as f:
+        f.write(f"{len(names)}\n")
+        f.writelines(f"{types[i]} {names[i][1:]} {coords[i, 0]} {coords[i, 1]}\n" for i in order.tolist())
+        f.writelines(f"{names[u]} {names[v]} {w}\n" for u, v, w in zip(edge_u.tolist(), edge_v.tolist(), edge_w.tolist()))
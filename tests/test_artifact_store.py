@@ -0,0 +1,21 @@
+import numpy as np
+
+
+def test_routers_share_tables_and_keep_road_changes_private(store):
+    first, second = store.router(), store.router()
+    assert first.tables is second.tables and first.cache is not second.cache
+    graph = store.graph()
+    u, v, weight = str(graph.names[graph.edge_u[0]]), str(graph.names[graph.edge_v[0]]), float(graph.edge_w[0])
+    before = second.distance(u, v)
+    first.update_edge(None, u, v, weight, weight / 10)
+    assert first.distance(u, v) < before
+    assert second.distance(u, v) == before and store.router().distance(u, v) == before
+    assert np.array_equal(store.router().weights, graph.weights)
+
+
+def test_router_distances_match_the_travel_time_table(store):
+    router, travel_times = store.router(), store.travel_times()
+    rng = np.random.default_rng(0)
+    nodes = travel_times.nodes
+    for i, j in rng.integers(len(nodes), size=(200, 2)):
+        assert np.isclose(router.dist[travel_times.index[nodes[i]], travel_times.index[nodes[j]]], travel_times.dist[i, j])
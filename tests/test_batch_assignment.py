@@ -0,0 +1,44 @@
+import itertools
+import numpy as np
+from batch_assignment import hungarian, solve_assignment, linear_sum_assignment
+
+
+def optimal_cost(cost):
+    if linear_sum_assignment is not None:
+        rows, cols = linear_sum_assignment(cost)
+        return cost[rows, cols].sum()
+    n, m = cost.shape
+    if n > m:
+        return optimal_cost(cost.T)
+    return min(cost[range(n), list(cols)].sum() for cols in itertools.permutations(range(m), n))
+
+
+def test_hungarian_matches_optimal_cost():
+    # The fallback solver against scipy (or brute force without it) on random rectangular matrices
+    rng = np.random.default_rng(0)
+    for _ in range(500):
+        n, m = rng.integers(1, 7, size=2)
+        cost = rng.integers(0, 20, size=(n, m)).astype(float)
+        rows, cols = hungarian(cost)
+        assert len(rows) == min(n, m) and len(set(rows)) == len(rows) and len(set(cols)) == len(cols)
+        assert np.isclose(cost[rows, cols].sum(), optimal_cost(cost)), (cost, rows, cols)
+
+
+def test_solve_assignment_never_returns_infeasible_pairs():
+    rng = np.random.default_rng(1)
+    for _ in range(500):
+        n, m = rng.integers(1, 7, size=2)
+        cost = rng.integers(0, 20, size=(n, m)).astype(float)
+        cost[rng.random((n, m)) < 0.4] = np.inf
+        pairs = solve_assignment(cost)
+        assert all(np.isfinite(cost[row, col]) for row, col in pairs)
+        assert len({row for row, _ in pairs}) == len(pairs) == len({col for _, col in pairs})
+        # No larger feasible matching exists, whatever the cost
+        feasible = np.where(np.isfinite(cost), 0.0, 1.0)
+        rows, cols = hungarian(feasible)
+        assert len(pairs) == min(n, m) - int(feasible[rows, cols].sum()), (cost, pairs)
+
+
+def test_solve_assignment_of_empty_or_unreachable_batches():
+    assert solve_assignment(np.empty((0, 3))) == []
+    assert solve_assignment(np.full((2, 2), np.inf)) == []
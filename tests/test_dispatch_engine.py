@@ -0,0 +1,123 @@
+import io
+import pytest
+from call_source import poisson_calls
+from dispatch_engine import AmbulanceDispatch, POLICIES
+from event_log import EventLog, OFF
+from fleet_state import AVAILABLE, BUSY
+
+
+@pytest.fixture(scope='module')
+def cut_off(store):
+    # An emergency node with a single road, and the node at its other end
+    graph = store.graph().to_networkx()
+    node = next(node for node in graph.nodes if node.startswith('E') and graph.degree(node) == 1)
+    return node, next(iter(graph.adj[node]))
+
+
+def route_names(dispatcher, ambulance_id):
+    return [dispatcher.fleet.nodes[k] for k in dispatcher.fleet.route(ambulance_id)]
+
+
+@pytest.mark.parametrize('policy', list(POLICIES))
+def test_cut_off_calls_are_parked_and_warned_about_once(make_dispatcher, cut_off, policy):
+    # Closing the last road of an emergency node cuts its calls off; the run must still finish,
+    # serve every other call and keep the cut-off ones waiting
+    isolated, neighbor = cut_off
+    stream = io.StringIO()
+    dispatcher = make_dispatcher(policy, log=EventLog(stream=stream))
+    emergency_nodes = [node for node in dispatcher.graph.nodes if node.startswith('E')]
+    dispatcher.schedule_road_update(0, isolated, neighbor, float('inf'))
+    dispatcher.run_simulation(poisson_calls(1 / 60, emergency_nodes, seed=3, max_calls=300, weights=[
+        20.0 if node == isolated else 1.0 for node in emergency_nodes]))
+    waiting = [item[0][0] for _, _, item in dispatcher.priority_queue.entries.values()]
+    waiting += [item[0][0] for item, _, _ in dispatcher.parked.values()]
+    assert waiting and set(waiting) == {isolated}
+    assert len(dispatcher.results_writer.records) + len(waiting) == 300
+    assert stream.getvalue().count("cannot be reached") == len(waiting)
+
+
+def test_parked_calls_go_out_once_the_road_reopens(make_dispatcher, cut_off):
+    isolated, neighbor = cut_off
+    dispatcher = make_dispatcher('returning')
+    weight = dispatcher.graph[isolated][neighbor]['weight']
+    dispatcher.schedule_road_update(0, isolated, neighbor, float('inf'))
+    dispatcher.schedule_road_update(500, isolated, neighbor, weight)
+    dispatcher.run_simulation({1: (isolated, 1, 10), 2: (isolated, 1, 20)}, time_step=None)
+    assert sorted(record.patient_id for record in dispatcher.results_writer.records) == [1, 2]
+    assert all(record.assignment_time >= 500 for record in dispatcher.results_writer.records)
+    assert not dispatcher.parked and dispatcher.is_queue_empty()
+
+
+@pytest.mark.parametrize('policy', list(POLICIES))
+def test_closure_on_the_hospital_leg_moves_the_arrival(make_dispatcher, policy):
+    dispatcher = make_dispatcher(policy, stations=['A210'])
+    dispatcher.start({1: ('E28', 1, 0)}, time_step=None)
+    dispatcher.step(0)
+    route = route_names(dispatcher, 1)
+    planned = float(dispatcher.fleet.free_at[0])
+    start = dispatcher.fleet.route_start[0]
+    passed = route[int(dispatcher.fleet.route_arrival[start:start + len(route)].searchsorted(1, side='right')) - 1]
+    dispatcher.schedule_road_update(1, route[-2], route[-1], float('inf'))
+    dispatcher.resume()
+    record, = dispatcher.results_writer.records
+    assert record.hospital_arrival > planned
+    # Still on the way to the patient at the closure, so the new route runs through the patient
+    travel_times = dispatcher.travel_times
+    assert passed != 'E28' and 'E28' in route
+    assert record.hospital_arrival == pytest.approx(1 + travel_times.distance(passed, 'E28') + travel_times.distance('E28', route[-1]))
+
+
+def test_ambulance_cut_off_from_its_patient_gives_the_trip_up(make_dispatcher, cut_off):
+    isolated, neighbor = cut_off
+    dispatcher = make_dispatcher('returning', stations=['A210'])
+    dispatcher.start({1: (isolated, 1, 0)}, time_step=None)
+    dispatcher.step(0)
+    dispatcher.schedule_road_update(1, isolated, neighbor, float('inf'))
+    dispatcher.resume()
+    assert dispatcher.fleet.status[0] == AVAILABLE
+    assert dispatcher.is_waiting(1) and not dispatcher.results_writer.records
+    item, _, _ = dispatcher.parked[1]
+    assert item[0] == (isolated, 1, 0) and item[2] == 1  # requeued under its call type
+
+
+def test_ambulance_with_a_patient_waits_for_a_way_to_the_hospital(make_dispatcher, cut_off):
+    isolated, _ = cut_off
+    dispatcher = make_dispatcher('non_returning', stations=['A210'])
+    dispatcher.start({1: (isolated, 1, 0)}, time_step=None)
+    dispatcher.step(0)
+    route = route_names(dispatcher, 1)
+    hospital = route[-1]
+    picked_up = float(dispatcher.fleet.route_arrival[dispatcher.fleet.route_start[0] + route.index(isolated)])
+    roads = {neighbor: dispatcher.graph[hospital][neighbor]['weight'] for neighbor in dispatcher.graph.adj[hospital]}
+    for neighbor in roads:
+        dispatcher.schedule_road_update(picked_up + 0.5, hospital, neighbor, float('inf'))
+    dispatcher.resume(until=picked_up + 1)
+    assert dispatcher.fleet.status[0] == BUSY and dispatcher.fleet.free_at[0] == float('inf')
+    stranded_at = dispatcher.fleet.node_name(1)
+
+    for neighbor, weight in roads.items():
+        dispatcher.schedule_road_update(picked_up + 100, hospital, neighbor, weight)
+    dispatcher.resume()
+    record, = dispatcher.results_writer.records
+    assert record.hospital_arrival == pytest.approx(picked_up + 100 + dispatcher.travel_times.distance(stranded_at, hospital))
+
+
+def test_dispatcher_builds_its_own_hospital_assignments(store):
+    graph = store.graph().to_networkx()
+    dispatcher = AmbulanceDispatch(graph, {1: ('A210', None, 'A210', None, None)}, log=EventLog(level=OFF))
+    assert dispatcher.assignments == store.hospital_assignments()
+    dispatcher.run_simulation({1: ('E28', 1, 5)})
+    record, = dispatcher.results_writer.records
+    travel_times = dispatcher.travel_times
+    assert record.hospital_arrival == pytest.approx(5 + travel_times.distance('A210', 'E28') + travel_times.distance('E28', dispatcher.assignments['E28']))
+
+
+def test_calls_without_a_hospital_are_parked_not_routed(make_dispatcher):
+    stream = io.StringIO()
+    dispatcher = make_dispatcher('returning', log=EventLog(stream=stream))
+    dispatcher.assignments = {node: hospital for node, hospital in dispatcher.assignments.items() if node != 'E28'}
+    dispatcher.run_simulation({1: ('E28', 1, 5), 2: ('E28', 1, 10), 3: ('E30', 1, 15)}, time_step=None)
+    assert [record.patient_id for record in dispatcher.results_writer.records] == [3]
+    assert dispatcher.is_waiting(1) and dispatcher.is_waiting(2) and set(dispatcher.parked) == {1, 2}
+    assert stream.getvalue().count("No hospital is reachable from E28") == 2
+    assert "cannot be reached" not in stream.getvalue()
@@ -0,0 +1,116 @@
+import asyncio
+import json
+import numpy as np
+import pytest
+from call_source import poisson_calls
+from dispatch_service import DispatchService, SimulatedClock, write_response
+
+
+class BufferWriter:
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+
+def test_replies_are_strict_json():
+    writer = BufferWriter()
+    write_response(writer, 200, {'free_at': float('inf'), 'eta': np.float64(3.5), 'ambulances': [{'free_at': np.inf}]})
+    body = writer.data.split(b'\r\n\r\n', 1)[1]
+    assert b'Infinity' not in body
+    assert json.loads(body) == {'free_at': None, 'eta': 3.5, 'ambulances': [{'free_at': None}]}
+
+
+def test_call_ids_are_never_reused(make_dispatcher):
+    dispatcher = make_dispatcher('returning', stations=['A210'])
+
+    async def calls():
+        service = DispatchService(dispatcher, SimulatedClock())
+        try:
+            first = await service.submit_call('E28', 1, 1)
+            automatic = await service.submit_call('E8')
+            with pytest.raises(ValueError):
+                await service.submit_call('E31', 1, automatic['patient_id'])
+            with pytest.raises(ValueError):
+                await service.submit_call('E31', 1, 1)
+            return first, automatic
+        finally:
+            service.executor.shutdown()
+    first, automatic = asyncio.run(calls())
+    assert first['event'] == 'dispatched' and automatic['event'] == 'queued'
+    assert automatic['patient_id'] == 2
+    assert dispatcher.is_waiting(2) and len(dispatcher.priority_queue) == 1
+
+
+def test_service_decides_as_run_simulation(store, make_dispatcher):
+    # Drives the service over a real socket with a simulated clock: it must decide exactly as
+    # run_simulation does on the same calls and push every status change
+    stations = [node for node in store.node_names() if node.startswith('A')]
+    emergency_nodes = [node for node in store.node_names() if node.startswith('E')]
+    calls = dict(poisson_calls(len(stations) / 240.0, emergency_nodes, seed=5, max_calls=200))
+
+    offline = make_dispatcher('returning')
+    offline.run_simulation(calls, time_step=None, horizon=float('inf'))
+
+    async def run_service():
+        clock = SimulatedClock()
+        service = DispatchService(make_dispatcher('returning'), clock)
+        driver = asyncio.ensure_future(service.drive())
+        server = await service.serve(port=0)
+        port = server.sockets[0].getsockname()[1]
+        events_reader, events_writer = await asyncio.open_connection('127.0.0.1', port)
+        events_writer.write(b"GET /events HTTP/1.1\r\n\r\n")
+        await events_writer.drain()
+        await events_reader.readuntil(b'\r\n\r\n')
+        await asyncio.sleep(0)
+
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+
+        async def request(method, path, body=None):
+            data = json.dumps(body).encode() if body is not None else b''
+            writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data)
+            await writer.drain()
+            headers = (await reader.readuntil(b'\r\n\r\n')).decode()
+            length = int(headers.split('Content-Length: ')[1].split('\r\n')[0])
+            return json.loads(await reader.readexactly(length))
+
+        for patient_id, (node, patient_type, call_time) in calls.items():
+            await clock.advance_to(call_time)
+            await asyncio.sleep(0)
+            # Every third call gives its position instead, which must snap back to the same node
+            if patient_id % 3:
+                body = {'id': patient_id, 'node': node, 'type': patient_type}
+            else:
+                x, y = service.dispatcher.graph.nodes[node]['pos']
+                body = {'id': patient_id, 'x': x, 'y': y, 'type': patient_type}
+            decision = await request('POST', '/calls', body)
+            assert decision['patient_id'] == patient_id and decision['node'] == node, decision
+            assert decision['event'] in ('dispatched', 'queued'), decision
+        assert 'error' in await request('POST', '/calls', {'node': 'nowhere'})
+        await clock.advance_to(float('inf'))
+        while service.dispatcher.next_event_time() is not None:
+            await asyncio.sleep(0.01)
+        assert 'decision_us' in await request('GET', '/status')
+
+        pushed = {}
+        while True:
+            try:
+                block = await asyncio.wait_for(events_reader.readuntil(b'\n\n'), 0.2)
+            except asyncio.TimeoutError:
+                break
+            event = json.loads(block.decode().split('data: ', 1)[1])
+            pushed[event['event']] = pushed.get(event['event'], 0) + 1
+        writer.close()
+        events_writer.close()
+        await asyncio.sleep(0.05)  # lets both handlers see the hang-up
+        driver.cancel()
+        server.close()
+        service.executor.shutdown()
+        return service, pushed
+    service, pushed = asyncio.run(run_service())
+
+    service.dispatcher.results_writer.flush()
+    live = sorted(service.dispatcher.results_writer.records)
+    assert live and live == sorted(offline.results_writer.records)
+    assert pushed.get('delivered') == len(live) and pushed.get('dispatched') == len(live), pushed
@@ -0,0 +1,29 @@
+import pytest
+from movement_log import MovementLog
+
+
+@pytest.fixture
+def dispatcher(make_dispatcher):
+    return make_dispatcher('non_returning', stations=['A210'])
+
+
+def test_trip_without_a_route_passes_the_patient(dispatcher):
+    log = MovementLog().attach(dispatcher)
+    fleet, travel_times = dispatcher.fleet, dispatcher.travel_times
+    hospital = dispatcher.assignments['E28']
+    to_patient = travel_times.distance('A210', 'E28')
+    free_at = to_patient + travel_times.distance('E28', hospital)
+    fleet.dispatch(1, fleet.node_index[hospital], free_at, 1, 0, 0, fleet.node_index['E28'])
+    times, nodes = log.keyframes[1]
+    assert [fleet.nodes[node] for node in nodes] == ['A210', 'E28', hospital]
+    assert times == pytest.approx([0.0, to_patient, free_at])
+
+
+def test_replayed_trip_visits_the_patient(dispatcher):
+    log = MovementLog().attach(dispatcher)
+    dispatcher.run_simulation({1: ('E28', 1, 0)}, time_step=None)
+    record, = dispatcher.results_writer.records
+    times, nodes = log.keyframes[1]
+    visits = [time for time, node in zip(times, nodes) if dispatcher.fleet.nodes[node] == 'E28']
+    assert visits and visits[0] == pytest.approx(dispatcher.travel_times.distance('A210', 'E28'))
+    assert times[-1] == pytest.approx(record.hospital_arrival)
@@ -0,0 +1,16 @@
+from call_source import poisson_calls
+from profiler import Profiler
+
+
+def test_counters_include_table_reads_of_the_candidate_search(make_dispatcher):
+    dispatcher = make_dispatcher()
+    emergency_nodes = [node for node in dispatcher.graph.nodes if node.startswith('E')]
+    travel_times = dispatcher.travel_times
+    profiler = Profiler().attach(dispatcher)
+    dispatcher.run_simulation(poisson_calls(1 / 60, emergency_nodes, seed=3, max_calls=50))
+    profiler.detach()
+    counters = profiler.counters()
+    # Every call arriving with a free ambulance reads one travel time per free ambulance
+    assert counters['distance_reads'] >= profiler.calls['find_nearby_ambulances']
+    assert counters['routing_queries'] == sum(profiler.calls['routing.' + name] for name in ('distance', 'path', 'distances_from'))
+    assert 'distance' not in travel_times.__dict__ and dispatcher.profiler is None
@@ -0,0 +1,35 @@
+import json
+import math
+import numpy as np
+from replications import HISTOGRAM_BINS, merge_summaries, report_line
+
+
+def summary(mean_response, mean_wait, served, bin_index=0):
+    histogram = np.zeros(HISTOGRAM_BINS, dtype=np.int32)
+    histogram[bin_index] = served
+    return {'calls': 5, 'served': served, 'mean_response': mean_response, 'mean_wait': mean_wait, 'histogram': histogram}
+
+
+def test_a_single_replication_has_no_confidence_interval():
+    report = merge_summaries([(0, {'returning': summary(40.0, 3.0, 5, 39)})])
+    stats = report['returning']
+    assert stats['mean_response'] == 40.0 and stats['mean_wait'] == 3.0 and stats['ci95'] is None
+    json.dumps(report, allow_nan=False)
+    line = report_line('returning', stats)
+    assert "CI" not in line and "nan" not in line and "mean response 40.00" in line
+
+
+def test_replications_without_finished_trips_report_null():
+    report = merge_summaries([(seed, {'returning': summary(math.nan, math.nan, 0)}) for seed in range(3)])
+    stats = report['returning']
+    assert stats['mean_response'] is None and stats['mean_wait'] is None and stats['ci95'] is None
+    assert all(value is None for value in stats['percentiles'].values())
+    assert json.loads(json.dumps(report, allow_nan=False))['returning']['ci95'] is None
+    assert "nan" not in report_line('returning', stats)
+
+
+def test_confidence_interval_over_several_replications():
+    report = merge_summaries([(seed, {'returning': summary(mean, 2.0, 5)}) for seed, mean in enumerate([30.0, 40.0, 50.0])])
+    low, high = report['returning']['ci95']
+    assert low < 40.0 < high and high - 40.0 == 40.0 - low
+    assert "(95% CI" in report_line('returning', report['returning'])
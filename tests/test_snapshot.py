@@ -0,0 +1,50 @@
+import pytest
+from call_source import poisson_calls
+from dispatch_engine import POLICIES
+from event_log import EventLog, OFF
+from snapshot import fork, load_snapshot, save_snapshot
+
+SPLIT_TIME = 3000
+
+
+def start(make_dispatcher, policy):
+    # 400 calls with a road change before the split, which a restored run has to replay
+    dispatcher = make_dispatcher(policy)
+    emergency_nodes = [node for node in dispatcher.graph.nodes if node.startswith('E')]
+    dispatcher.schedule_road_update(1000, 'E28', next(iter(dispatcher.graph.adj['E28'])), 500.0)
+    dispatcher.start(poisson_calls(1 / 20, emergency_nodes, seed=11, max_calls=400), time_step=None)
+    return dispatcher
+
+
+def uninterrupted(make_dispatcher, policy):
+    dispatcher = start(make_dispatcher, policy)
+    dispatcher.resume()
+    return dispatcher.results_writer.records
+
+
+@pytest.mark.parametrize('policy', list(POLICIES))
+def test_restored_run_matches_an_uninterrupted_one(store, make_dispatcher, policy, tmp_path):
+    dispatcher = start(make_dispatcher, policy)
+    dispatcher.resume(until=SPLIT_TIME)
+    save_snapshot(dispatcher, str(tmp_path / 'run.snapshot'))
+    before = list(dispatcher.results_writer.records)
+    assert before and dispatcher.next_event_time() is not None
+
+    restored = load_snapshot(str(tmp_path / 'run.snapshot'), store.graph().to_networkx(), store.travel_times(),
+                             log=EventLog(level=OFF), assignments=store.hospital_assignments())
+    restored.resume()
+    assert before + restored.results_writer.records == uninterrupted(make_dispatcher, policy)
+
+
+def test_forked_branches_match_an_uninterrupted_run(make_dispatcher):
+    dispatcher = start(make_dispatcher, 'returning')
+    dispatcher.resume(until=SPLIT_TIME)
+    before = list(dispatcher.results_writer.records)
+    branches = fork(dispatcher, 2)
+    assert all(branch.log is dispatcher.log for branch in branches)
+    for branch in branches:
+        branch.resume()
+    dispatcher.resume()
+    expected = uninterrupted(make_dispatcher, 'returning')
+    assert before + dispatcher.results_writer.records[len(before):] == expected
+    assert all(before + branch.results_writer.records == expected for branch in branches)
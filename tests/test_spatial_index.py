@@ -0,0 +1,31 @@
+import networkx as nx
+import numpy as np
+from spatial_index import SpatialIndex, GridIndex, GraphGeometry
+
+
+def test_kd_tree_and_grid_snap_to_the_brute_force_nearest():
+    rng = np.random.default_rng(0)
+    points = rng.random((2000, 2)) * [1000, 300]
+    index = SpatialIndex(range(len(points)), points)
+    grid = GridIndex(points)
+    for query in rng.random((500, 2)) * [1100, 400] - 50:
+        brute = np.hypot(*(points - query).T)
+        _, distance = index.snap(*query)
+        grid_distance, _ = grid.query(query)
+        assert np.isclose(distance, brute.min()) and np.isclose(grid_distance, brute.min()), (query, distance, grid_distance)
+
+
+def test_lower_bounds_never_exceed_travel_times():
+    rng = np.random.default_rng(1)
+    graph = nx.random_geometric_graph(200, 0.15, seed=1)
+    graph = nx.relabel_nodes(graph, {i: f"E{i}" for i in graph.nodes})
+    for u, v in graph.edges:
+        length = np.hypot(*(np.subtract(graph.nodes[u]['pos'], graph.nodes[v]['pos'])))
+        graph[u][v]['weight'] = length * (1.5 + rng.random())
+    nodes = list(graph.nodes)
+    geometry = GraphGeometry(graph, nodes)
+    target = nodes[0]
+    travel = nx.single_source_dijkstra_path_length(graph, target)
+    reached = [node for node in nodes if node in travel]
+    lower = geometry.lower_bounds([geometry.index[node] for node in reached], target)
+    assert (lower <= np.array([travel[node] for node in reached]) + 1e-9).all()
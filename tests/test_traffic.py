@@ -0,0 +1,90 @@
+import heapq
+import numpy as np
+import pytest
+from traffic import TrafficProfile, TrafficTravelTimes
+
+PERIOD = 1440.0
+
+
+def make_traffic(graph):
+    # Four six-hour buckets, two profiles spread over the edges at random
+    rng = np.random.default_rng(7)
+    profiles = [[1.0, 2.5, 1.2, 0.8], [1.0, 1.1, 3.0, 0.6]]
+    return TrafficTravelTimes(graph, TrafficProfile(profiles, rng.integers(0, 2, len(graph.edge_u)), PERIOD))
+
+
+def time_dependent_travel_time(traffic, source, target, depart_time):
+    # Reference: Dijkstra over arrival times, each edge costing its weight in the bucket it is entered in
+    graph = traffic.graph
+    arrival = {source: depart_time}
+    heap = [(depart_time, source)]
+    while heap:
+        t, node = heapq.heappop(heap)
+        if node == target:
+            return t - depart_time
+        if t > arrival[node]:
+            continue
+        bucket = traffic.profile.bucket(t)
+        for neighbor in graph.indices[graph.indptr[node]:graph.indptr[node + 1]].tolist():
+            nt = t + traffic.edge_weight(traffic.nodes[node], traffic.nodes[neighbor], bucket)
+            if nt < arrival.get(neighbor, float('inf')):
+                arrival[neighbor] = nt
+                heapq.heappush(heap, (nt, neighbor))
+    return float('inf')
+
+
+@pytest.fixture
+def traffic(store):
+    return make_traffic(store.graph())
+
+
+def sample_pairs(traffic, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, len(traffic.nodes), (n, 2)).tolist()
+
+
+def test_bucket_tables_match_time_dependent_routes_inside_a_bucket(traffic):
+    checked = 0
+    for bucket in range(traffic.profile.n_buckets):
+        depart = bucket * traffic.profile.bucket_length
+        table = traffic.table(bucket)
+        for i, j in sample_pairs(traffic, 40, seed=bucket):
+            expected = time_dependent_travel_time(traffic, i, j, depart)
+            assert traffic.travel_time(traffic.nodes[i], traffic.nodes[j], depart) == pytest.approx(expected)
+            if not traffic.crosses_bucket(depart, depart + expected):
+                assert table.dist[i, j] == pytest.approx(expected)
+                checked += 1
+    assert checked > 100
+
+
+def test_route_across_a_bucket_boundary(traffic):
+    # Leaving shortly before the rush-hour bucket starts, the trip runs into it: the route pays the
+    # later bucket's weights on the way, the table of the departure bucket does not
+    boundary = traffic.profile.bucket_length
+    i, j = max(sample_pairs(traffic, 200), key=lambda pair: traffic.table(0).dist[pair[0], pair[1]] if pair[0] != pair[1] else 0)
+    first_bucket_time = traffic.table(0).dist[i, j]
+    depart = boundary - first_bucket_time / 2
+    travel_time, path, edge_times = traffic.route(traffic.nodes[i], traffic.nodes[j], depart)
+    assert traffic.crosses_bucket(depart, depart + travel_time)
+    assert travel_time == pytest.approx(time_dependent_travel_time(traffic, i, j, depart))
+    assert travel_time > first_bucket_time
+    assert sum(edge_times) == pytest.approx(travel_time) and path[0] == traffic.nodes[i] and path[-1] == traffic.nodes[j]
+
+
+@pytest.mark.parametrize('factor', [0.2, 3.0, float('inf')])
+def test_update_edge_repairs_the_cached_tables_in_place(traffic, factor):
+    tables = {bucket: traffic.table(bucket) for bucket in range(traffic.profile.n_buckets)}
+    graph = traffic.graph
+    # The most used road of bucket 0, so the change reaches many pairs
+    pred = tables[0].pred
+    counts = np.zeros((graph.n_nodes, graph.n_nodes), dtype=np.int64)
+    np.add.at(counts, (pred[pred >= 0], np.nonzero(pred >= 0)[1]), 1)
+    a, b = np.unravel_index(np.argmax(counts + counts.T), counts.shape)
+    u, v = traffic.nodes[a], traffic.nodes[b]
+    old_weight = float(graph.edge_w[((graph.edge_u == a) & (graph.edge_v == b)) | ((graph.edge_u == b) & (graph.edge_v == a))][0])
+    traffic.update_edge(None, u, v, old_weight, old_weight * factor)
+
+    rebuilt = TrafficTravelTimes(traffic.graph, traffic.profile)
+    for bucket, table in tables.items():
+        assert traffic.tables[bucket] is table
+        np.testing.assert_allclose(table.dist, rebuilt.table(bucket).dist)
@@ -0,0 +1,44 @@
+import random
+from triage_queue import TriageQueue
+
+
+def check_invariants(queue):
+    for heap in queue.heaps.values():
+        assert len(heap.position) == len(heap.heap)
+        for i, (_, _, patient_id) in enumerate(heap.heap):
+            assert heap.position[patient_id] == i
+            assert i == 0 or heap.heap[(i - 1) >> 1] <= heap.heap[i]
+    assert len(queue) == sum(len(heap) for heap in queue.heaps.values())
+
+
+def test_random_operations_keep_heap_invariants_and_scoring():
+    # Random pushes, cancellations, escalations and pops against the heap invariants and the scoring rule
+    rng = random.Random(0)
+    queue = TriageQueue({1: (0.0, 0.0), 2: (-30.0, 0.5), 3: (-60.0, 1.0)})
+    time, next_id = 0.0, 0
+    for _ in range(20000):
+        time += rng.random()
+        op = rng.random()
+        if op < 0.4 or not queue:
+            queue.push(next_id, ('call', next_id), time, rng.choice((1, 2, 3)))
+            next_id += 1
+        elif op < 0.55:
+            queue.remove(rng.choice(list(queue.entries)))
+        elif op < 0.75:
+            queue.reprioritize(rng.choice(list(queue.entries)), acuity=rng.choice((None, 1, 2, 3)),
+                               enqueue_time=rng.choice((None, time - 50 * rng.random())))
+        else:
+            best = min(queue.score(acuity, enqueue_time, time) for acuity, enqueue_time, _ in queue.entries.values())
+            acuity, enqueue_time, _ = queue.entries[queue.peek(time)[0]]
+            patient_id, item = queue.pop(time)
+            assert item == ('call', patient_id) and patient_id not in queue
+            assert queue.score(acuity, enqueue_time, time) == best
+        check_invariants(queue)
+
+
+def test_aging_lets_an_old_low_acuity_call_overtake():
+    queue = TriageQueue({1: (0.0, 1.0), 2: (-30.0, 0.0)})
+    queue.push('old', 'a', 0.0, 1)
+    queue.push('urgent', 'b', 10.0, 2)
+    assert queue.peek(10.0)[0] == 'urgent'
+    assert queue.peek(50.0)[0] == 'old'
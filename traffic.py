@@ -0,0 +1,179 @@
+import heapq
+import json
+import os
+from collections import OrderedDict
+import networkx as nx
+import numpy as np
+from csr_graph import CSRGraph, build_csr
+from travel_times import build_travel_times
+
+# Time-of-day traffic. Every edge follows one multiplier profile, a list of factors for equal time
+# buckets over a period (e.g. 24 hourly factors over 1440 minutes); its travel time at time t is
+# the graph file weight times the factor of t's bucket. Profiles are read from a JSON file next
+# to the graph file:
+#     {"period": 1440, "profiles": {"city": [...], "highway": [...]},
+#      "default": "city", "edges": {"E1 E2": "highway", ...}}
+
+
+class TrafficProfile:
+    def __init__(self, profiles, edge_profile, period=1440.0):
+        self.profiles = np.asarray(profiles, dtype=float)  # (n_profiles, n_buckets)
+        self.edge_profile = np.asarray(edge_profile, dtype=np.int32)  # profile row of each edge, file order
+        self.period = float(period)
+        self.n_buckets = self.profiles.shape[1]
+        self.bucket_length = self.period / self.n_buckets
+
+    def bucket(self, time):
+        return int(time % self.period // self.bucket_length)
+
+    def edge_multipliers(self, bucket):
+        return self.profiles[self.edge_profile, bucket]
+
+
+def traffic_profile_path(graph_file_path):
+    return os.path.splitext(graph_file_path)[0] + '_traffic.json'
+
+
+def load_traffic_profile(file_path, graph):
+    with open(file_path, 'r') as f:
+        spec = json.load(f)
+    names = list(spec['profiles'])
+    rows = {name: i for i, name in enumerate(names)}
+    edge_profile = np.full(len(graph.edge_u), rows[spec.get('default', names[0])], dtype=np.int32)
+    edge_ids = {}
+    for e, (u, v) in enumerate(zip(graph.edge_u.tolist(), graph.edge_v.tolist())):
+        edge_ids[(u, v)] = edge_ids[(v, u)] = e
+    for edge, profile in spec.get('edges', {}).items():
+        node1, node2 = edge.split()
+        edge_profile[edge_ids[(graph.index[node1], graph.index[node2])]] = rows[profile]
+    return TrafficProfile([spec['profiles'][name] for name in names], edge_profile, spec.get('period', 1440.0))
+
+
+class TrafficTravelTimes:
+    # Per-bucket all-pairs tables built lazily and kept in an LRU of cache_size buckets, so the
+    # dispatcher only swaps which TravelTimeMatrix it reads when the clock enters another bucket.
+    # travel_time() is the exact time-dependent Dijkstra, for trips that must account for crossing
+    # bucket boundaries on the way.
+    def __init__(self, graph, profile, cache_size=4):
+        self.graph = graph
+        self.profile = profile
+        self.cache_size = cache_size
+        self.tables = OrderedDict()
+        self.hits = self.misses = 0
+        self.nodes = [str(name) for name in graph.names]
+        self.index = graph.index
+        # Edge id of every CSR entry, in the order build_csr lays them out
+        m = len(graph.edge_u)
+        order = np.argsort(np.concatenate([graph.edge_u, graph.edge_v]), kind='stable')
+        self.csr_edge = np.concatenate([np.arange(m), np.arange(m)])[order]
+        self.edge_ids = None  # (u, v) node names -> edge id, built on first use
+
+    def table(self, bucket):
+        travel_times = self.tables.get(bucket)
+        if travel_times is not None:
+            self.hits += 1
+            self.tables.move_to_end(bucket)
+            return travel_times
+        self.misses += 1
+        travel_times = build_travel_times(self.bucket_graph(bucket))
+        self.tables[bucket] = travel_times
+        if len(self.tables) > self.cache_size:
+            self.tables.popitem(last=False)
+        return travel_times
+
+    def bucket_graph(self, bucket):
+        # The graph with the edge weights of `bucket`
+        graph = self.graph
+        edge_w = graph.edge_w * self.profile.edge_multipliers(bucket)
+        indptr, indices, weights = build_csr(graph.n_nodes, graph.edge_u, graph.edge_v, edge_w)
+        return CSRGraph(graph.names, graph.types, graph.coords, indptr, indices, weights, graph.edge_u, graph.edge_v, edge_w)
+
+    def for_time(self, time):
+        return self.table(self.profile.bucket(time))
+
+    def crosses_bucket(self, start_time, end_time):
+        # True if a trip over [start_time, end_time] runs into another bucket than the one it started in
+        return start_time // self.profile.bucket_length != end_time // self.profile.bucket_length
+
+    def edge_weight(self, u, v, bucket):
+        if self.edge_ids is None:
+            names = [str(name) for name in self.graph.names]
+            self.edge_ids = {}
+            for e, (a, b) in enumerate(zip(self.graph.edge_u.tolist(), self.graph.edge_v.tolist())):
+                self.edge_ids[(names[a], names[b])] = self.edge_ids[(names[b], names[a])] = e
+        e = self.edge_ids[(u, v)]
+        return float(self.graph.edge_w[e] * self.profile.profiles[self.profile.edge_profile[e], bucket])
+
+    def edge_weights(self, path, time):
+        # Travel time of each edge of a node path in the bucket of `time`, the weights its table was built from
+        bucket = self.profile.bucket(time)
+        return [self.edge_weight(u, v, bucket) for u, v in zip(path, path[1:])]
+
+    def weight_function(self, time):
+        # weight(u, v, data) for searches over the networkx graph, in the bucket of `time`
+        bucket = self.profile.bucket(time)
+        return lambda u, v, data: self.edge_weight(u, v, bucket)
+
+    def update_edge(self, graph, u, v, old_weight, new_weight):
+        # The base weight changes in every bucket, so each cached table is repaired in place with the
+        # road's old and new weight in its bucket (see TravelTimeMatrix.update_edge)
+        a, b = self.index[u], self.index[v]
+        g = self.graph
+        edge = ((g.edge_u == a) & (g.edge_v == b)) | ((g.edge_u == b) & (g.edge_v == a))
+        e = int(np.flatnonzero(edge)[0])
+        old_base = float(g.edge_w[e])
+        edge_w = np.array(g.edge_w)
+        edge_w[edge] = new_weight
+        indptr, indices, weights = build_csr(g.n_nodes, g.edge_u, g.edge_v, edge_w)
+        self.graph = CSRGraph(g.names, g.types, g.coords, indptr, indices, weights, g.edge_u, g.edge_v, edge_w)
+        for bucket, travel_times in self.tables.items():
+            multiplier = self.profile.profiles[self.profile.edge_profile[e], bucket]
+            travel_times.update_edge(self.bucket_graph(bucket), u, v, old_base * multiplier, new_weight * multiplier)
+
+    def route(self, source, target, depart_time):
+        # Time-dependent Dijkstra: each edge costs its weight in the bucket the vehicle enters it.
+        # -> (travel time, node path, edge times), for trips that run past the end of a bucket;
+        # raises NetworkXNoPath when target is unreachable
+        graph, profile = self.graph, self.profile
+        source_index, target_index = self.index[source], self.index[target]
+        arrival = {source_index: depart_time}
+        pred = {source_index: -1}
+        done = set()
+        heap = [(depart_time, source_index)]
+        while heap:
+            t, node = heapq.heappop(heap)
+            if node == target_index:
+                break
+            if node in done:
+                continue
+            done.add(node)
+            start, end = graph.indptr[node], graph.indptr[node + 1]
+            multipliers = profile.profiles[profile.edge_profile[self.csr_edge[start:end]], profile.bucket(t)]
+            for neighbor, w in zip(graph.indices[start:end].tolist(), (graph.weights[start:end] * multipliers).tolist()):
+                nt = t + w
+                if nt < arrival.get(neighbor, float('inf')):
+                    arrival[neighbor] = nt
+                    pred[neighbor] = node
+                    heapq.heappush(heap, (nt, neighbor))
+        else:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        path = [target_index]
+        while path[-1] != source_index:
+            path.append(pred[path[-1]])
+        path.reverse()
+        times = [arrival[node] for node in path]
+        return times[-1] - depart_time, [self.nodes[node] for node in path], [b - a for a, b in zip(times, times[1:])]
+
+    def travel_time(self, source, target, depart_time):
+        try:
+            return self.route(source, target, depart_time)[0]
+        except nx.NetworkXNoPath:
+            return float('inf')
+
+
+def load_traffic(graph, graph_file_path, cache_size=4):
+    # None when there is no profile file next to the graph, i.e. the static graph file weights apply
+    file_path = traffic_profile_path(graph_file_path)
+    if not os.path.exists(file_path):
+        return None
+    return TrafficTravelTimes(graph, load_traffic_profile(file_path, graph), cache_size)
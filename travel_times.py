@@ -0,0 +1,145 @@
+import heapq
+import networkx as nx
+import numpy as np
+from csr_graph import CSRGraph
+
+try:
+    from scipy.sparse import csr_matrix
+    from scipy.sparse.csgraph import dijkstra as csgraph_dijkstra
+except ImportError:  # scipy is optional, fall back to a vectorized Floyd-Warshall
+    csgraph_dijkstra = None
+
+
+class TravelTimeMatrix:
+    # All-pairs travel times and predecessors, dist[i, j] is the travel time from node i to node j
+    # and pred[i, j] the node before j on that shortest path (-1 if there is none)
+    def __init__(self, nodes, dist, pred):
+        self.nodes = list(nodes)
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.dist = dist
+        self.pred = pred
+
+    def distance(self, source, target):
+        d = self.dist[self.index[source], self.index[target]]
+        if d == np.inf:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        return float(d)
+
+    def path(self, source, target):
+        i, j = self.index[source], self.index[target]
+        if self.dist[i, j] == np.inf:
+            raise nx.NetworkXNoPath(f"No path between {source} and {target}.")
+        path = [j]
+        while j != i:
+            j = int(self.pred[i, j])
+            path.append(j)
+        return [self.nodes[k] for k in reversed(path)]
+
+    def distances_from(self, source):
+        return self.dist[self.index[source]]
+
+    def update_edge(self, graph, u, v, old_weight, new_weight):
+        # Repairs the table after road u-v changed from old_weight to new_weight (inf closes it);
+        # `graph` already carries the new weight. A cached table is memory-mapped read-only, so the
+        # first update takes a private copy.
+        if not self.dist.flags.writeable or not self.pred.flags.writeable:
+            self.dist, self.pred = np.array(self.dist), np.array(self.pred)
+        dist, pred = self.dist, self.pred
+        a, b = self.index[u], self.index[v]
+        directions = ((a, b),) if graph.is_directed() else ((a, b), (b, a))
+        if new_weight < old_weight:
+            # A pair can only get shorter by using the road: one vectorized relaxation per direction
+            for x, y in directions:
+                via = dist[:, x:x + 1] + new_weight + dist[y:y + 1, :]
+                rows, cols = np.nonzero(via < dist)
+                if len(rows):
+                    dist[rows, cols] = via[rows, cols]
+                    pred[rows, cols] = np.where(cols == y, x, pred[y, cols])
+            return
+        # Slower or closed: only sources whose shortest-path tree contains the road change, rerun those rows
+        uses_edge = np.zeros(len(self.nodes), dtype=bool)
+        for x, y in directions:
+            uses_edge |= pred[:, y] == x
+        affected = np.flatnonzero(uses_edge)
+        if len(affected):
+            dist[affected], pred[affected] = shortest_path_rows(graph, affected)
+
+
+def edge_lists(graph):
+    # (nodes, rows, cols, weights, directed) of a CSRGraph or networkx graph
+    if isinstance(graph, CSRGraph):
+        nodes = [str(name) for name in graph.names]
+        rows, cols, weights = graph.edge_u.tolist(), graph.edge_v.tolist(), graph.edge_w.tolist()
+        directed = False
+    else:
+        nodes = list(graph.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        rows, cols, weights = [], [], []
+        for u, v, data in graph.edges(data=True):
+            rows.append(index[u])
+            cols.append(index[v])
+            weights.append(data['weight'])
+        directed = graph.is_directed()
+    return nodes, rows, cols, weights, directed
+
+
+def build_travel_times(graph):
+    nodes, rows, cols, weights, directed = edge_lists(graph)
+    n = len(nodes)
+    pred_dtype = np.int16 if n < np.iinfo(np.int16).max else np.int32
+
+    if csgraph_dijkstra is not None:
+        adjacency = csr_matrix((weights, (rows, cols)), shape=(n, n))
+        dist, pred = csgraph_dijkstra(adjacency, directed=directed, return_predecessors=True)
+        pred[pred < 0] = -1
+        return TravelTimeMatrix(nodes, dist, pred.astype(pred_dtype))
+
+    dist = np.full((n, n), np.inf)
+    pred = np.full((n, n), -1, dtype=pred_dtype)
+    np.fill_diagonal(dist, 0.0)
+    for u, v, w in zip(rows, cols, weights):
+        if w < dist[u, v]:
+            dist[u, v], pred[u, v] = w, u
+            if not directed:
+                dist[v, u], pred[v, u] = w, v
+    for k in range(n):
+        via = dist[:, k:k + 1] + dist[k:k + 1, :]
+        better = via < dist
+        dist = np.where(better, via, dist)
+        pred = np.where(better, pred[k:k + 1, :], pred)
+    return TravelTimeMatrix(nodes, dist, pred)
+
+
+def shortest_path_rows(graph, sources):
+    # Dijkstra from the given source indices only, (dist, pred) rows in the layout of TravelTimeMatrix
+    nodes, rows, cols, weights, directed = edge_lists(graph)
+    n = len(nodes)
+    if csgraph_dijkstra is not None:
+        adjacency = csr_matrix((weights, (rows, cols)), shape=(n, n))
+        dist, pred = csgraph_dijkstra(adjacency, directed=directed, indices=sources, return_predecessors=True)
+        pred[pred < 0] = -1
+        return dist, pred
+    adjacency = [[] for _ in range(n)]
+    for u, v, w in zip(rows, cols, weights):
+        adjacency[u].append((v, w))
+        if not directed:
+            adjacency[v].append((u, w))
+    dist = np.full((len(sources), n), np.inf)
+    pred = np.full((len(sources), n), -1)
+    for row, source in enumerate(sources):
+        dist[row, source] = 0.0
+        heap = [(0.0, source)]
+        while heap:
+            d, node = heapq.heappop(heap)
+            if d > dist[row, node]:
+                continue
+            for neighbor, w in adjacency[node]:
+                if d + w < dist[row, neighbor]:
+                    dist[row, neighbor], pred[row, neighbor] = d + w, node
+                    heapq.heappush(heap, (d + w, neighbor))
+    return dist, pred
+
+
+def path_uses_edge(path, u, v):
+    # True if the node path drives road u-v in either direction
+    return any((x == u and y == v) or (x == v and y == u) for x, y in zip(path, path[1:]))
@@ -0,0 +1,155 @@
+import itertools
+from sequence_counter import SequenceCounter
+
+DEFAULT_ACUITY = 1
+
+
+class IndexedHeap:
+    # Binary min-heap of (key, seq, patient_id) entries with a patient_id -> position index, so an
+    # entry can be re-keyed or removed in O(log n) instead of rebuilding the heap
+    def __init__(self):
+        self.heap = []
+        self.position = {}
+
+    def __len__(self):
+        return len(self.heap)
+
+    def __contains__(self, patient_id):
+        return patient_id in self.position
+
+    def peek(self):
+        return self.heap[0]
+
+    def push(self, patient_id, key, seq):
+        self.heap.append((key, seq, patient_id))
+        self.position[patient_id] = len(self.heap) - 1
+        self.sift_up(len(self.heap) - 1)
+
+    def pop(self):
+        return self.remove(self.heap[0][2])
+
+    def remove(self, patient_id):
+        i = self.position.pop(patient_id)
+        entry = self.heap[i]
+        last = self.heap.pop()
+        if i < len(self.heap):
+            self.heap[i] = last
+            self.position[last[2]] = i
+            self.sift_up(i)
+            self.sift_down(self.position[last[2]])
+        return entry
+
+    def update(self, patient_id, key):
+        i = self.position[patient_id]
+        _, seq, _ = self.heap[i]
+        self.heap[i] = (key, seq, patient_id)
+        self.sift_up(i)
+        self.sift_down(self.position[patient_id])
+
+    def sift_up(self, i):
+        heap, position = self.heap, self.position
+        entry = heap[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if heap[parent] <= entry:
+                break
+            heap[i] = heap[parent]
+            position[heap[i][2]] = i
+            i = parent
+        heap[i] = entry
+        position[entry[2]] = i
+
+    def sift_down(self, i):
+        heap, position = self.heap, self.position
+        n = len(heap)
+        entry = heap[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and heap[child + 1] < heap[child]:
+                child += 1
+            if entry <= heap[child]:
+                break
+            heap[i] = heap[child]
+            position[heap[i][2]] = i
+            i = child
+        heap[i] = entry
+        position[entry[2]] = i
+
+
+class TriageQueue(SequenceCounter):
+    # Waiting calls keyed by patient id, one indexed heap per acuity class ordered by enqueue time.
+    # classes maps acuity -> (offset, aging_rate): a call's score at time t is
+    #     offset + enqueue_time - aging_rate * (t - enqueue_time)
+    # and the lowest score is served first. Aging never reorders calls inside a class, so it is
+    # evaluated lazily on pop by comparing the class heads only.
+    def __init__(self, classes=None, default_acuity=DEFAULT_ACUITY):
+        self.classes = dict(classes or {default_acuity: (0.0, 0.0)})
+        self.default_acuity = default_acuity
+        self.heaps = {acuity: IndexedHeap() for acuity in self.classes}
+        self.entries = {}  # patient_id -> (acuity, enqueue_time, item)
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __contains__(self, patient_id):
+        return patient_id in self.entries
+
+    def push(self, patient_id, item, time, acuity=None):
+        acuity = self.default_acuity if acuity is None else acuity
+        if patient_id in self.entries:
+            self.remove(patient_id)
+        self.entries[patient_id] = (acuity, time, item)
+        self.heaps[acuity].push(patient_id, time, next(self.counter))
+
+    def score(self, acuity, enqueue_time, time):
+        offset, aging_rate = self.classes[acuity]
+        return offset + enqueue_time - aging_rate * (time - enqueue_time)
+
+    def peek(self, time):
+        # (patient_id, item) of the call that would be served at `time`, or None
+        best = None
+        for acuity, heap in self.heaps.items():
+            if heap:
+                enqueue_time, seq, patient_id = heap.peek()
+                candidate = (self.score(acuity, enqueue_time, time), seq, patient_id)
+                if best is None or candidate < best:
+                    best = candidate
+        if best is None:
+            return None
+        return best[2], self.entries[best[2]][2]
+
+    def pop(self, time):
+        patient_id, item = self.peek(time)
+        self.remove(patient_id)
+        return patient_id, item
+
+    def remove(self, patient_id):
+        # Cancellation; returns the queued item
+        acuity, _, item = self.entries.pop(patient_id)
+        self.heaps[acuity].remove(patient_id)
+        return item
+
+    def reprioritize(self, patient_id, acuity=None, enqueue_time=None):
+        # Escalate/de-escalate a call to another acuity class and/or change its effective enqueue time
+        old_acuity, old_time, item = self.entries[patient_id]
+        acuity = old_acuity if acuity is None else acuity
+        enqueue_time = old_time if enqueue_time is None else enqueue_time
+        if acuity == old_acuity:
+            self.heaps[acuity].update(patient_id, enqueue_time)
+        else:
+            self.heaps[old_acuity].remove(patient_id)
+            self.heaps[acuity].push(patient_id, enqueue_time, next(self.counter))
+        self.entries[patient_id] = (acuity, enqueue_time, item)
+
+    def enqueue_time(self, patient_id):
+        return self.entries[patient_id][1]
+
+    def acuity(self, patient_id):
+        return self.entries[patient_id][0]
+